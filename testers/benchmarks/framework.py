@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the tester framework on synthetic workloads, without any database, jvm or other external tool: loading large
+specs and assigning their points, running large matrices of stub tests, formatting huge test outputs, and collecting
+large uam result files.
+Reports the throughput and the peak python memory of each stage. The results can be saved as a json baseline and later
+compared against it.
+
+Usage: framework.py [--tests N] [--datasets N] [--output-size N] [--uam-results N] [--save file] [--baseline file]
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from markus_tester import MarkusTester, MarkusTestSpecs, MarkusTest  # noqa: E402
+from uam_tester import UAMTester  # noqa: E402
+
+
+class BenchTest(MarkusTest):
+    """
+    A stub test that passes or fails alternately, with an output of configurable size.
+    """
+
+    OUTPUT_SIZE = 100
+
+    def run(self):
+        output = ('<out> & "x"\n' * (BenchTest.OUTPUT_SIZE // 12 + 1))[:BenchTest.OUTPUT_SIZE]
+        if len(self.test_file) % 2:
+            return self.failed(message=output, oracle_solution='expected\n', test_solution='actual\n')
+        return self.passed(message=output)
+
+
+def write_specs(specs_dir, num_tests, num_datasets):
+    matrix = {'test{}.sql'.format(i): {'data{}.sql'.format(j): 1 for j in range(num_datasets)}
+              for i in range(num_tests)}
+    for i in range(0, num_tests, 3):
+        matrix['test{}.sql'.format(i)]['extra'] = {'order_by': 'word'}
+    path_to_specs = os.path.join(specs_dir, 'specs.json')
+    with open(path_to_specs, 'w') as specs_open:
+        json.dump({'matrix': matrix, 'feedback_file': os.path.join(specs_dir, 'feedback.txt')}, specs_open)
+    return path_to_specs
+
+
+def write_uam_results(results_dir, num_results):
+    results = {}
+    for i in range(num_results // 100 + 1):
+        passes, failures, errors = {}, {}, {}
+        for j in range(min(100, num_results - i * 100)):
+            test_id = 'test_file{}.Test{}.test_{}'.format(i, i, j)
+            if j % 3 == 0:
+                passes[test_id] = 'description {}'.format(j)
+            elif j % 3 == 1:
+                failures[test_id] = {'description': 'description {}'.format(j), 'message': 'assertion failed',
+                                     'details': 'Traceback (most recent call last):\n' * 20}
+            else:
+                errors[test_id] = {'description': 'description {}'.format(j), 'message': 'error',
+                                   'details': 'Traceback (most recent call last):\n' * 20}
+        results['test_file{}.Test{}'.format(i, i)] = {'passes': passes, 'failures': failures, 'errors': errors}
+    result_file = os.path.join(results_dir, 'result.json')
+    with open(result_file, 'w') as result_open:
+        json.dump({'results': results}, result_open)
+    return result_file
+
+
+def measure(stage):
+    """
+    Runs a stage twice: once to time it, and once more with tracemalloc to measure its peak python memory.
+    :param stage: A function running the stage and returning the number of items processed.
+    :return A (items, seconds, peak memory in bytes) tuple.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    items = stage()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return items, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the tester framework on synthetic workloads.')
+    parser.add_argument('--tests', type=int, default=200, help='number of tests in the specs (default 200)')
+    parser.add_argument('--datasets', type=int, default=20, help='number of datasets per test (default 20)')
+    parser.add_argument('--output-size', type=int, default=10 * 1024 * 1024,
+                        help='size of the huge test outputs in characters (default 10MB)')
+    parser.add_argument('--uam-results', type=int, default=50000,
+                        help='number of results in the uam result file (default 50000)')
+    parser.add_argument('--save', help='save the results as a json baseline')
+    parser.add_argument('--baseline', help='compare the results against a json baseline')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, 'w') as devnull:
+        path_to_specs = write_specs(work_dir, args.tests, args.datasets)
+        result_file = write_uam_results(work_dir, args.uam_results)
+        num_cells = args.tests * args.datasets
+        specs = MarkusTestSpecs(path_to_specs)
+
+        def load_specs():
+            MarkusTestSpecs(path_to_specs)
+            return 1
+
+        def set_points():
+            specs['test_points'] = {'test{}.sql'.format(i): 2 for i in range(0, args.tests, 2)}
+            specs['data_points'] = {'data{}.sql'.format(j): 3 for j in range(0, args.datasets, 2)}
+            specs['all_points'] = 1
+            return num_cells
+
+        def compile_plan():
+            specs['all_points'] = 1  # invalidates the compiled plan
+            return len(specs.plan)
+
+        def run_tests(output_size):
+            def stage():
+                BenchTest.OUTPUT_SIZE = output_size
+                with contextlib.redirect_stdout(devnull):
+                    MarkusTester(specs, BenchTest).run()
+                return num_cells
+            return stage
+
+        def format_results():
+            output = ('<out> & "x"\n' * (args.output_size // 12 + 1))[:args.output_size]
+            for i in range(10):
+                str(MarkusTest.format_result('test', MarkusTest.Status.FAIL, output, 0, 1))
+            return 10 * args.output_size
+
+        def collect_results():
+            tester = UAMTester(path_to_uam='', path_to_tests='', test_points={}, result_filename=result_file)
+            num_results = 0
+            for _ in tester.collect_results():
+                num_results += 1
+            return num_results
+
+        stages = [
+            ('specs load (cached)', load_specs, 'loads'),
+            ('specs points', set_points, 'cells'),
+            ('plan compile', compile_plan, 'cells'),
+            ('run (small outputs)', run_tests(100), 'tests'),
+            ('run (100KB outputs)', run_tests(100 * 1024), 'tests'),
+            ('format_result (huge outputs)', format_results, 'chars'),
+            ('uam collect_results', collect_results, 'results'),
+        ]
+        results = {}
+        print('{:<32} {:>10} {:>20} {:>12}'.format('stage', 'seconds', 'throughput', 'peak (MB)'))
+        for name, stage, unit in stages:
+            items, seconds, peak = measure(stage)
+            results[name] = {'seconds': seconds, 'throughput': items / seconds, 'peak': peak}
+            print('{:<32} {:>10.4f} {:>20} {:>12.1f}'.format(
+                name, seconds, '{:.0f} {}/s'.format(items / seconds, unit), peak / 1024 / 1024))
+
+    if args.baseline:
+        with open(args.baseline) as baseline_open:
+            baseline = json.load(baseline_open)
+        print('\n{:<32} {:>20} {:>20}'.format('stage', 'throughput vs base', 'peak vs base'))
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            print('{:<32} {:>19.2f}x {:>19.2f}x'.format(name, result['throughput'] / baseline[name]['throughput'],
+                                                       result['peak'] / max(baseline[name]['peak'], 1)))
+    if args.save:
+        with open(args.save, 'w') as save_open:
+            json.dump(results, save_open, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Measures the startup cost of the tester entry points: the cumulative import time reported by 'python -X importtime',
+and the wall-clock time of a python process that just imports the entry point.
+Each measure is the best of a number of runs, in milliseconds. If a budget file is passed (a json object mapping entry
+points to their max import time in milliseconds), exits with an error when an entry point exceeds its budget.
+
+Usage: startup.py [-n runs] [-b budget.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+TESTERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# entry point module -> tester server dirs it needs on the path (relative to the testers dir)
+ENTRY_POINTS = {
+    'markus_tester': [],
+    'markus_uam_tester': [],
+    'markus_sql_tester': ['sql/server'],
+    'markus_jdbc_tester': ['jdbc/server', 'sql/server'],
+    'markus_xquery_tester': ['xquery/server'],
+    'markus_jam_tester': ['java/server'],
+    'markus_pam_tester': ['python/server'],
+}
+
+
+def get_env(server_dirs):
+    path = [TESTERS_DIR] + [os.path.join(TESTERS_DIR, server_dir) for server_dir in server_dirs]
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join(path + ([env['PYTHONPATH']] if 'PYTHONPATH' in env else []))
+    return env
+
+
+def measure_import(module, env):
+    """
+    Imports a module in a new python process.
+    :return A (cumulative import time, process wall-clock time) tuple in milliseconds, or None if the import fails.
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)], env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    wall_time = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        return None
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.rpartition(':')[2].split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000, wall_time
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the startup cost of the tester entry points.')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='number of runs per entry point (default 5)')
+    parser.add_argument('-b', '--budget', help='json file with the max import time of each entry point (ms)')
+    args = parser.parse_args()
+    budget = {}
+    if args.budget:
+        with open(args.budget) as budget_open:
+            budget = json.load(budget_open)
+
+    over_budget = []
+    print('{:<24} {:>12} {:>12}'.format('entry point', 'import (ms)', 'process (ms)'))
+    for module, server_dirs in sorted(ENTRY_POINTS.items()):
+        env = get_env(server_dirs)
+        measures = [measure_import(module, env) for _ in range(args.runs)]
+        if None in measures:
+            print('{:<24} {:>12}'.format(module, 'import error'))
+            continue
+        import_time = min(measure[0] for measure in measures)
+        wall_time = min(measure[1] for measure in measures)
+        print('{:<24} {:>12.1f} {:>12.1f}'.format(module, import_time, wall_time))
+        if module in budget and import_time > budget[module]:
+            over_budget.append('{} ({:.1f}ms > {}ms)'.format(module, import_time, budget[module]))
+    if over_budget:
+        print('Over budget: {}'.format(', '.join(over_budget)), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -43,6 +43,11 @@ create_venv() {
     echo "${THISSCRIPTDIR}" > ${VENVDIR}/lib/python${PYVERSION}/site-packages/markus.pth
 }
 
+cache_specs() {
+    echo "[ENV] Compiling specs cache"
+    ${VENVDIR}/bin/python3 -c "import markus_tester; markus_tester.MarkusTestSpecs('${SPECSDIR}/specs.json')"
+}
+
 suggest_next_steps() {
     echo "[ENV] (You must use this shebang in your test scripts: '#!${VENVDIR}/bin/python3')"
 }
@@ -73,6 +78,7 @@ fi
 check_tester_existence
 install_packages
 create_specs
+create_venv # before init_specs, which can run python tools from the venv
 init_specs
-create_venv
+cache_specs
 suggest_next_steps
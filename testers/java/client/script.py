@@ -5,7 +5,6 @@ import sys
 
 from markus_jam_tester import MarkusJAMTester
 from markus_tester import MarkusTestSpecs
-from markusapi import Markus
 
 
 if __name__ == '__main__':
@@ -26,6 +25,23 @@ if __name__ == '__main__':
     SPECS['test_points'] = {'Test1.java': POINTS1}
     SPECS['test_points'] = {'Test2.java': POINTS2}
 
+    # The max number of output characters reported for a single test and for all tests, keeping the head and the tail of
+    # longer outputs (default to no limit if commented out).
+    # SPECS['max_test_output'] = 10000
+    # SPECS['max_run_output'] = 100000
+
+    # A file name or an open file descriptor where each test result is also written as a json object per line, without
+    # the test output (defaults to no json results if commented out). An error of the whole run is written as a single
+    # result with the 'error_all' status.
+    # SPECS['results_json'] = 'results.ndjson'
+
+    # A directory where javac compilations are cached, keyed by the java sources, the classpath and the javac binary:
+    # unchanged submissions reuse their class files or compiler errors (defaults to no cache if commented out). Since
+    # student code could forge entries, tests only read the cache, and only if the test user can't write the directory:
+    # entries are written by running 'python3 javac_cache.py /path/to/cache [javac args] files.java' as the directory
+    # owner, in a copy of the sources to cache (e.g. the starter code).
+    # SPECS['javac_cache'] = '/path/to/cache'
+
     # The feedback file name (defaults to no feedback file if commented out).
     # SPECS['feedback_file'] = 'feedback_java.txt'
 
@@ -33,6 +49,7 @@ if __name__ == '__main__':
     tester.run()
     # Use markus apis if needed
     # if os.path.isfile(SPECS['feedback_file']):
+    #     from markusapi import Markus  # imported only when needed, to keep the startup fast
     #     api = Markus(api_key, root_url)
     #     with open(SPECS['feedback_file']) as feedback_open:
     #         api.upload_feedback_file(assignment_id, group_id, SPECS['feedback_file'], feedback_open.read())
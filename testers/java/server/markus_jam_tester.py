@@ -2,7 +2,7 @@ import glob
 import subprocess
 
 from jam_tester import JAMTester
-from markus_tester import MarkusTester
+from javac_cache import JavacCache, compile_java
 from markus_uam_tester import MarkusUAMTester, MarkusUAMTest
 
 
@@ -20,17 +20,14 @@ class MarkusJAMTester(MarkusUAMTester):
         try:
             java_files = glob.glob('*.java')
             if not java_files:
-                print(MarkusTester.error_all(message=self.ERROR_MGSG['no_submission']))
+                self.write_error_all(message=self.ERROR_MGSG['no_submission'])
                 return
             try:
-                javac_cmd = ['javac']
-                javac_cmd.extend(java_files)
-                subprocess.run(javac_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
-                               check=True)
+                compile_java(java_files, cache_dir=self.specs.get(JavacCache.SPECS_KEY))
             except subprocess.CalledProcessError as e:
                 msg = self.ERROR_MGSG['bad_javac'].format(e.stdout)
-                print(MarkusTester.error_all(message=msg))
+                self.write_error_all(message=msg)
                 return
         except Exception as e:
-            print(MarkusTester.error_all(message=str(e)))
+            self.write_error_all(message=str(e))
         super().run()
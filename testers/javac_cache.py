@@ -0,0 +1,181 @@
+import contextlib
+import hashlib
+import marshal
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+class JavacCache:
+    """
+    An on-disk cache of javac compilations, keyed by the hash of the sources, the classpath and the javac binary. A
+    cached compilation restores its class files, or raises its compiler errors again.
+    Since student code run as the test user could forge entries, test runs only read the cache, and only if they can't
+    write the cache directory. Entries are written by running this module as the owner of the cache directory, e.g. from
+    init_specs.sh on the solution or starter sources:
+    python3 javac_cache.py /path/to/cache [javac args] file1.java file2.java ...
+    """
+
+    SPECS_KEY = 'javac_cache'
+    CACHE_VERSION = 1
+
+    def __init__(self, cache_dir, writable=False):
+        """
+        :param cache_dir: The cache directory, created if it does not exist.
+        :param writable: Whether compilations are written to the cache, only outside of test runs.
+        """
+        self.cache_dir = cache_dir
+        self.writable = writable
+        if writable:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.owner = os.stat(cache_dir).st_uid if os.path.isdir(cache_dir) else None
+
+    @staticmethod
+    def stat_path(path):
+        """
+        Gets the (path, size, modification time) of the files of a classpath entry, to detect changes in it.
+        """
+        if os.path.isfile(path):
+            path_stat = os.stat(path)
+            return [(path, path_stat.st_size, path_stat.st_mtime_ns)]
+        stats = []
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                with contextlib.suppress(OSError):
+                    file_path = os.path.join(dir_path, file_name)
+                    file_stat = os.stat(file_path)
+                    stats.append((file_path, file_stat.st_size, file_stat.st_mtime_ns))
+        return stats
+
+    def get_key(self, java_files, javac_args):
+        """
+        Gets the cache key of a compilation.
+        :param java_files: The java source files.
+        :param javac_args: The other javac arguments.
+        :return The cache key.
+        """
+        javac = os.path.realpath(shutil.which('javac') or 'javac')
+        javac_stat = os.stat(javac)
+        classpath = os.environ.get('CLASSPATH', '')
+        if '-cp' in javac_args:
+            classpath = javac_args[javac_args.index('-cp') + 1]
+        # the current directory is hashed below by content, since its files change with each submission
+        classpath_stats = [self.stat_path(path) for path in classpath.split(os.pathsep) if path not in ('', '.')]
+        key_hash = hashlib.sha256(marshal.dumps((self.CACHE_VERSION, javac, javac_stat.st_size, javac_stat.st_mtime_ns,
+                                                 list(javac_args), classpath, classpath_stats)))
+        # javac can also read any source or class file under the current directory, through the classpath or the
+        # sourcepath, and not just the files it is passed
+        java_files = sorted(os.path.normpath(java_file) for java_file in java_files)
+        source_files = set(java_files)
+        for dir_path, dir_names, file_names in os.walk('.'):
+            dir_names.sort()
+            source_files.update(os.path.normpath(os.path.join(dir_path, file_name)) for file_name in file_names
+                                if file_name.endswith(('.java', '.class')))
+        key_hash.update(marshal.dumps(java_files))
+        for source_file in sorted(source_files):
+            key_hash.update(source_file.encode())
+            with open(source_file, 'rb') as source_open:
+                key_hash.update(hashlib.sha256(source_open.read()).digest())
+        return key_hash.hexdigest()
+
+    def get(self, key):
+        """
+        Gets a cached compilation.
+        :param key: The cache key.
+        :return A (javac return code, javac output, dict of class file path -> contents) tuple, or None if the key is
+                not cached or the cache can't be trusted.
+        """
+        if self.owner is None or (not self.writable and os.access(self.cache_dir, os.W_OK)):
+            return None
+        entry_path = os.path.join(self.cache_dir, key)
+        try:
+            with open(entry_path, 'rb') as entry_open:
+                if os.fstat(entry_open.fileno()).st_uid != self.owner:
+                    return None
+                entry = marshal.load(entry_open)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if entry[0] != JavacCache.CACHE_VERSION:
+            return None
+        return entry[1:]
+
+    def put(self, key, returncode, output, class_files):
+        """
+        Caches a compilation, if the cache is writable.
+        """
+        if not self.writable:
+            return
+        entry_path = os.path.join(self.cache_dir, key)
+        entry_tmp = '{}.{}'.format(entry_path, os.getpid())
+        try:
+            with open(entry_tmp, 'wb') as entry_open:
+                marshal.dump((JavacCache.CACHE_VERSION, returncode, output, class_files), entry_open)
+            os.replace(entry_tmp, entry_path)
+        except (OSError, ValueError):  # best effort
+            with contextlib.suppress(OSError):
+                os.remove(entry_tmp)
+
+    def compile(self, java_files, javac_args=()):
+        """
+        Compiles java files into the current directory, replaying an identical previous compilation when cached.
+        :param java_files: The java source files.
+        :param javac_args: The other javac arguments (but -d).
+        :raise subprocess.CalledProcessError: If the compilation fails, with the javac output in stdout.
+        """
+        key = self.get_key(java_files, javac_args)
+        entry = self.get(key)
+        javac_command = ['javac'] + list(javac_args) + list(java_files)
+        if entry is None:
+            with tempfile.TemporaryDirectory() as class_dir:
+                javac = subprocess.run(javac_command[:1] + ['-d', class_dir] + javac_command[1:],
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+                class_files = {}
+                if javac.returncode == 0:
+                    for dir_path, _, file_names in os.walk(class_dir):
+                        for file_name in file_names:
+                            file_path = os.path.join(dir_path, file_name)
+                            with open(file_path, 'rb') as class_open:
+                                class_files[os.path.relpath(file_path, class_dir)] = class_open.read()
+            entry = (javac.returncode, javac.stdout, class_files)
+            self.put(key, *entry)
+        returncode, output, class_files = entry
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, javac_command, output=output)
+        for class_file, contents in class_files.items():
+            class_dir = os.path.dirname(class_file)
+            if class_dir:
+                os.makedirs(class_dir, exist_ok=True)
+            with open(class_file, 'wb') as class_open:
+                class_open.write(contents)
+
+
+def compile_java(java_files, javac_args=(), cache_dir=None):
+    """
+    Compiles java files into the current directory, through a JavacCache if a cache directory is passed.
+    :param java_files: The java source files.
+    :param javac_args: The other javac arguments (but -d).
+    :param cache_dir: The JavacCache directory (defaults to no cache).
+    :raise subprocess.CalledProcessError: If the compilation fails, with the javac output in stdout.
+    """
+    if cache_dir is not None:
+        JavacCache(cache_dir).compile(java_files, javac_args)
+        return
+    javac_command = ['javac'] + list(javac_args) + list(java_files)
+    subprocess.run(javac_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
+                   check=True)
+
+
+if __name__ == '__main__':
+    # writes the compilation of the java files in the current directory to the cache
+    if len(sys.argv) < 3:
+        print('Usage: {} cache_dir [javac args] file1.java file2.java ...'.format(sys.argv[0]), file=sys.stderr)
+        sys.exit(1)
+    files = [arg for arg in sys.argv[2:] if arg.endswith('.java')]
+    args = [arg for arg in sys.argv[2:] if not arg.endswith('.java')]
+    try:
+        JavacCache(sys.argv[1], writable=True).compile(files, args)
+    except subprocess.CalledProcessError as e:  # the compiler errors are cached too
+        print(e.stdout, file=sys.stderr)
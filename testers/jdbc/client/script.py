@@ -6,7 +6,6 @@ import os
 
 from markus_jdbc_tester import MarkusJDBCTester
 from markus_tester import MarkusTestSpecs
-from markusapi import Markus
 
 
 if __name__ == '__main__':
@@ -41,6 +40,30 @@ if __name__ == '__main__':
     # The schema name
     SPECS['schema_name'] = 'ate'
 
+    # The max number of output characters reported for a single test and for all tests, keeping the head and the tail of
+    # longer outputs (default to no limit if commented out).
+    # SPECS['max_test_output'] = 10000
+    # SPECS['max_run_output'] = 100000
+
+    # A file name or an open file descriptor where each test result is also written as a json object per line, without
+    # the test output (defaults to no json results if commented out). An error of the whole run is written as a single
+    # result with the 'error_all' status.
+    # SPECS['results_json'] = 'results.ndjson'
+
+    # Whether the java tests run in a single jvm, started once per run and loading the submission classes again for each
+    # test, instead of a jvm per test (defaults to False if commented out). It needs the MarkusJDBCTest class of the
+    # solution to be compiled from server/MarkusJDBCTest.java, which supports the '--server' mode. The max time in
+    # seconds of each java test in that jvm, which is restarted after a timeout (defaults to no limit if commented out).
+    # SPECS['java_server'] = True
+    # SPECS['java_timeout'] = 30
+
+    # A directory where javac compilations are cached, keyed by the java sources, the classpath and the javac binary:
+    # unchanged submissions reuse their class files or compiler errors (defaults to no cache if commented out). Since
+    # student code could forge entries, tests only read the cache, and only if the test user can't write the directory:
+    # entries are written by running 'python3 javac_cache.py /path/to/cache [javac args] files.java' as the directory
+    # owner, in a copy of the sources to cache (e.g. the starter code).
+    # SPECS['javac_cache'] = '/path/to/cache'
+
     # The feedback file name (defaults to no feedback file if commented out).
     # SPECS['feedback_file'] = 'feedback_jdbc.txt'
 
@@ -48,6 +71,7 @@ if __name__ == '__main__':
     tester.run()
     # Use markus apis if needed
     # if os.path.isfile(SPECS['feedback_file']):
+    #     from markusapi import Markus  # imported only when needed, to keep the startup fast
     #     api = Markus(api_key, root_url)
     #     with open(SPECS['feedback_file']) as feedback_open:
     #         api.upload_feedback_file(assignment_id, group_id, SPECS['feedback_file'], feedback_open.read())
@@ -62,3 +62,5 @@ shopt -s extglob
 rm -f ${CLASSDIR}/!(@(MarkusJDBCTest*.class|JDBCSubmission*.class)) # deletes all but those files
 echo "[JDBC] Updating json specs file"
 sed -i -e "s#/path/to/solution#${SOLUTIONDIR}#g" ${SPECS}
+echo "[JDBC] Caching oracle results and converting datasets"
+python3 ${TESTERDIR}/server/markus_jdbc_tester.py ${SPECS} ${ORACLEUSER}
@@ -1,6 +1,8 @@
 import java.io.*;
 import java.lang.reflect.InvocationTargetException;
 import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
 import java.sql.*;
 import java.text.MessageFormat;
 import java.util.*;
@@ -31,6 +33,7 @@ public class MarkusJDBCTest {
     }
     private static final String CONNECTION_TEST = "CONNECTION";
     private static final String DISCONNECTION_TEST = "DISCONNECTION";
+    private static final String SERVER_MODE = "--server";
     private static String JDBC_PREAMBLE = "jdbc:postgresql://localhost:5432/";
 
     private String oracleDatabase;
@@ -42,11 +45,13 @@ public class MarkusJDBCTest {
     private String className;
     private String methodName;
     private boolean orderOn;
+    private ClassLoader classLoader;
     private Connection oracleConnection;
     private JDBCSubmission testSubmission;
 
     public MarkusJDBCTest(String oracleDatabase, String testDatabase, String userName, String userPassword,
-                          String schemaName, String dataName, String className, String methodName, boolean orderOn) {
+                          String schemaName, String dataName, String className, String methodName, boolean orderOn,
+                          ClassLoader classLoader) {
 
         this.oracleDatabase = oracleDatabase;
         this.testDatabase = testDatabase;
@@ -57,6 +62,7 @@ public class MarkusJDBCTest {
         this.className = className;
         this.methodName = methodName;
         this.orderOn = orderOn;
+        this.classLoader = classLoader;
     }
 
     private static Object[] getInputs(String className, String methodName, String dataName) {
@@ -128,7 +134,7 @@ public class MarkusJDBCTest {
     private TestStatus initDB() {
 
         try {
-            this.testSubmission = (JDBCSubmission) Class.forName(this.className).newInstance();
+            this.testSubmission = (JDBCSubmission) Class.forName(this.className, true, this.classLoader).newInstance();
             boolean testConnected = this.testSubmission.connectDB(JDBC_PREAMBLE + this.testDatabase, this.userName,
                                                                   this.userPassword);
             if (!testConnected || this.testSubmission.connection == null ||
@@ -232,7 +238,7 @@ public class MarkusJDBCTest {
         return new TestStatus("pass", "");
     }
 
-    private void run() {
+    private TestStatus run() {
 
         // redirect stdout and stderr
         PrintStream outOrig = System.out, errOrig = System.err;
@@ -263,12 +269,57 @@ public class MarkusJDBCTest {
         if (this.methodName.equals(MarkusJDBCTest.DISCONNECTION_TEST) && testStatus.status.equals("pass")) {
             testStatus = closeResult;
         }
-        // restore stdout and stderr, then print results
+        // restore stdout and stderr
         System.setOut(outOrig);
         System.setErr(errOrig);
-        System.out.print(testStatus.status);
-        if (!testStatus.status.equals("pass")) {
-            System.err.print(testStatus.msg);
+
+        return testStatus;
+    }
+
+    private static MarkusJDBCTest create(String[] args, ClassLoader classLoader) {
+
+        String oracleDatabase = args[0];
+        String userName = args[1];
+        String userPassword = args[2];
+        String schemaName = args[3];
+        String testName = args[4];
+        String dataName = args[5];
+        boolean orderOn = Boolean.valueOf(args[6]);
+        String testDatabase = args[7];
+        String[] testNames = testName.split("\\.");
+
+        return new MarkusJDBCTest(oracleDatabase, testDatabase, userName, userPassword, schemaName, dataName,
+                                  testNames[0], testNames[1], orderOn, classLoader);
+    }
+
+    private static void serve() throws IOException {
+
+        // each request is a line with the tab-separated arguments of a test, each response is a line with the test
+        // status and the byte length of the message, followed by the message
+        PrintStream responses = new PrintStream(new FileOutputStream(FileDescriptor.out), false, "UTF-8");
+        BufferedReader requests = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+        // the tests can't write anything else to stdout, not even from threads outliving them
+        PrintStream nullStream = new PrintStream(new OutputStream() {
+            public void write(int b) throws IOException {}
+        });
+        System.setOut(nullStream);
+        System.setErr(nullStream);
+        // the submission classes are loaded again by each test, the solution classes and the jdbc driver just once
+        URL[] submissionUrls = {new File(".").toURI().toURL()};
+        ClassLoader solutionLoader = MarkusJDBCTest.class.getClassLoader();
+        String request;
+        while ((request = requests.readLine()) != null) {
+            TestStatus testStatus;
+            try (URLClassLoader submissionLoader = new URLClassLoader(submissionUrls, solutionLoader)) {
+                testStatus = MarkusJDBCTest.create(request.split("\t", -1), submissionLoader).run();
+            }
+            catch (Throwable e) {
+                testStatus = new TestStatus("error", MessageFormat.format(ERROR_MSGS.get("ex_output"), e.toString()));
+            }
+            byte[] msg = (testStatus.status.equals("pass") ? "" : testStatus.msg).getBytes("UTF-8");
+            responses.print(testStatus.status + " " + msg.length + "\n");
+            responses.write(msg);
+            responses.flush();
         }
     }
 
@@ -310,8 +361,12 @@ public class MarkusJDBCTest {
         }
     }
 
-    public static void main(String args[]) {
+    public static void main(String args[]) throws IOException {
 
+        if (args[0].equals(MarkusJDBCTest.SERVER_MODE)) { // run tests from stdin
+            MarkusJDBCTest.serve();
+            return;
+        }
         String oracleDatabase = args[0];
         String userName = args[1];
         String userPassword = args[2];
@@ -329,9 +384,12 @@ public class MarkusJDBCTest {
             MarkusJDBCTest.initTestEnv(oracleDatabase, userName, dataName, className, methodName);
         }
         else { // run test
-            MarkusJDBCTest test = new MarkusJDBCTest(oracleDatabase, testDatabase, userName, userPassword, schemaName,
-                                                     dataName, className, methodName, orderOn);
-            test.run();
+            MarkusJDBCTest test = MarkusJDBCTest.create(args, MarkusJDBCTest.class.getClassLoader());
+            TestStatus testStatus = test.run();
+            System.out.print(testStatus.status);
+            if (!testStatus.status.equals("pass")) {
+                System.err.print(testStatus.msg);
+            }
         }
     }
 
@@ -1,9 +1,94 @@
 import collections
 import os
+import select
 import subprocess
+import sys
+import time
 
+from javac_cache import JavacCache, compile_java
 from markus_sql_tester import MarkusSQLTester, MarkusSQLTest
-from markus_tester import MarkusTester, MarkusTest
+from markus_tester import MarkusTest, MarkusTestSpecs
+
+
+class MarkusJDBCJavaServer:
+    """
+    A long-lived jvm running the java checks of the tests, which loads the submission classes again for each check.
+    It is driven through its stdin and stdout: each request is a line with the tab-separated arguments of a check, each
+    response is a line with the check status and the byte length of its message, followed by the message. The jvm is
+    started on the first check, and again after it crashes or times out.
+    """
+
+    def __init__(self, classpath, timeout=None):
+        self.command = ['java', '-cp', classpath, MarkusJDBCTest.__name__, '--server']
+        self.timeout = timeout
+        self.process = None
+        self._buffer = b''
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL)
+        self._buffer = b''
+
+    def stop(self):
+        """
+        Stops the jvm, if running.
+        :return: The jvm exit code, or None if it was not running.
+        """
+        if self.process is None:
+            return None
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.stdin.close()
+        self.process.stdout.close()
+        returncode = self.process.wait()
+        self.process = None
+        return returncode
+
+    def _read(self, size, deadline):
+        """
+        Reads from the jvm stdout until the buffer holds a line (if size is None) or size bytes.
+        :raise EOFError: If the jvm exits first.
+        :raise subprocess.TimeoutExpired: If the deadline passes first.
+        """
+        while (b'\n' not in self._buffer) if size is None else (len(self._buffer) < size):
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+            if not ready:
+                raise subprocess.TimeoutExpired(self.command, self.timeout)
+            data = os.read(self.process.stdout.fileno(), 65536)
+            if not data:
+                raise EOFError
+            self._buffer += data
+        if size is None:
+            data, _, self._buffer = self._buffer.partition(b'\n')
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def check(self, java_args):
+        """
+        Runs a java check.
+        :param java_args: The arguments of the check, as passed to a single MarkusJDBCTest run.
+        :return: A subprocess.CompletedProcess with the check status as stdout and its message as stderr.
+        :raise subprocess.CalledProcessError: If the jvm crashes during the check.
+        :raise subprocess.TimeoutExpired: If the check times out, the jvm is killed.
+        """
+        if self.process is None or self.process.poll() is not None:
+            self.stop()
+            self.start()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        try:
+            self.process.stdin.write('{}\n'.format('\t'.join(java_args)).encode())
+            self.process.stdin.flush()
+            status, length = self._read(None, deadline).decode().split()
+            message = self._read(int(length), deadline).decode()
+        except (BrokenPipeError, EOFError):
+            returncode = self.stop()
+            raise subprocess.CalledProcessError(returncode, self.command, output='', stderr='the jvm exited')
+        except subprocess.TimeoutExpired:
+            self.stop()
+            raise
+        return subprocess.CompletedProcess(self.command, 0, stdout=status, stderr=message)
 
 
 class MarkusJDBCTest(MarkusSQLTest):
@@ -24,14 +109,55 @@ class MarkusJDBCTest(MarkusSQLTest):
         return self.test_file
 
     def check_java(self, order_on=False):
-        java_command = ['java', '-cp', self.java_classpath, self.__class__.__name__, self.oracle_database,
-                        self.user_name, self.user_password, self.schema_name, self.test_name, self.data_name,
-                        str(order_on), self.test_database]
+        java_args = [self.oracle_database, self.user_name, self.user_password, self.schema_name, self.test_name,
+                     self.data_name, str(order_on), self.test_database]
+        if self.tester.java_server is not None:
+            return self.tester.java_server.check(java_args)
+        java_command = ['java', '-cp', self.java_classpath, self.__class__.__name__] + java_args
         java = subprocess.run(java_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
                               check=True)
 
         return java
 
+    def fetch_results(self, table_names):
+        """
+        Fetches the oracle and test results of tables with a single query per connection, instead of a query per table
+        on each connection (the oracle results come from the oracle cache when possible).
+        :param table_names: The table names.
+        :return: A dict of table name -> (oracle columns, oracle results, test columns, test results, test row count).
+        """
+        oracle_tables = {}
+        uncached_tables = []
+        for table_name in table_names:
+            cached = self.tester.oracle_cache.get((self.data_name, table_name, None))
+            if cached is not None:
+                oracle_tables[table_name] = cached
+            else:
+                uncached_tables.append(table_name)
+        if uncached_tables:
+            if self.oracle_connection is None:  # not connected when the oracle cache is used
+                self.tester.init_oracle_db()
+                self.oracle_connection = self.tester.oracle_connection
+                self.oracle_cursor = self.tester.oracle_cursor
+            try:
+                fetched = self.fetch_tables(self.oracle_connection, self.data_name, uncached_tables)
+            finally:
+                self.oracle_connection.commit()
+            for table_name, (oracle_results, _, oracle_columns) in fetched.items():
+                oracle_tables[table_name] = (oracle_columns, oracle_results)
+        # (at most one test row more than the oracle rows is fetched, like in get_test_results)
+        limits = {table_name: len(oracle_tables[table_name][1]) + 1 for table_name in table_names}
+        try:
+            test_tables = self.fetch_tables(self.test_connection, self.schema_name, table_names, limits)
+        finally:
+            self.test_connection.commit()
+        results = {}
+        for table_name in table_names:
+            oracle_columns, oracle_results = oracle_tables[table_name]
+            test_results, test_count, test_columns = test_tables[table_name]
+            results[table_name] = (oracle_columns, oracle_results, test_columns, test_results, test_count)
+        return results
+
     def run(self):
 
         # drop and recreate test schema + dataset, then fetch and compare java results
@@ -44,7 +170,8 @@ class MarkusJDBCTest(MarkusSQLTest):
             if java.stdout == MarkusTest.Status.ERROR.value:
                 return self.error(message=java.stderr)
         except Exception as e:
-            self.oracle_connection.commit()
+            if self.oracle_connection is not None:  # not connected when the oracle cache is used
+                self.oracle_connection.commit()
             self.test_connection.commit()
             if isinstance(e, subprocess.CalledProcessError):
                 msg = self.ERROR_MSGS['bad_java'].format(e.stdout + e.stderr)
@@ -55,26 +182,49 @@ class MarkusJDBCTest(MarkusSQLTest):
             points_earned = self.points[self.JAVA_POINTS_KEY]
         else:
             return self.passed()
-        # fetch and compare sql table results
+        # compare all sql table fingerprints in one round trip, then fetch the mismatching tables in one round trip and
+        # compare them (falling back to fetching each table on its own, to report its own error)
+        table_names = sorted(table_name for table_name in self.points if table_name != self.JAVA_POINTS_KEY)
+        try:
+            matching_tables = self.check_fingerprints(table_names)
+        except Exception:  # the full comparison reports the error
+            self.test_connection.commit()
+            matching_tables = set()
+        mismatching_tables = [table_name for table_name in table_names if table_name not in matching_tables]
+        fetched = {}
+        if len(mismatching_tables) > 1:
+            try:
+                fetched = self.fetch_results(mismatching_tables)
+            except Exception:  # each table is fetched on its own below
+                pass
         messages = []
         oracle_solutions = []
         test_solutions = []
-        for table_name, table_points in sorted(self.points.items()):
-            if table_name == self.JAVA_POINTS_KEY:
+        for table_name in table_names:
+            table_points = self.points[table_name]
+            if table_name in matching_tables:
+                points_earned += table_points
                 continue
             try:
-                test_results = self.get_test_results(table_name)
-                oracle_results = self.get_oracle_results(table_name)
-                status, message = self.check_results(oracle_results, test_results, order_on=False)
+                if table_name in fetched:
+                    (self.oracle_columns, oracle_results, self.test_columns, test_results,
+                     self.test_count) = fetched[table_name]
+                else:
+                    oracle_results = self.get_oracle_results(table_name)
+                    test_results = self.get_test_results(table_name, limit=len(oracle_results) + 1)
+                status, message = self.check_results(oracle_results, test_results, order_on=False,
+                                                     test_count=self.test_count)
                 if status is MarkusTest.Status.PASS:
                     points_earned += table_points
                 else:
-                    oracle_solution, test_solution = self.get_psql_dump(table_name)
+                    oracle_solution = self.format_table(self.oracle_columns, oracle_results)
+                    test_solution = self.format_table(self.test_columns, test_results, self.test_count)
                     messages.append('(Table {}) {}'.format(table_name, message))
                     oracle_solutions.append(oracle_solution)
                     test_solutions.append(test_solution)
             except Exception as e:
-                self.oracle_connection.commit()
+                if self.oracle_connection is not None:
+                    self.oracle_connection.commit()
                 self.test_connection.commit()
                 messages.append('(Table {}) {}'.format(table_name, str(e)))
         if points_earned == self.points_total:
@@ -88,6 +238,8 @@ class MarkusJDBCTest(MarkusSQLTest):
 class MarkusJDBCTester(MarkusSQLTester):
 
     CLASS_DIR = 'classes'
+    JAVA_SERVER_KEY = 'java_server'
+    JAVA_TIMEOUT_KEY = 'java_timeout'
 
     def __init__(self, specs, test_class=MarkusJDBCTest):
         super().__init__(specs, test_class)
@@ -95,11 +247,28 @@ class MarkusJDBCTester(MarkusSQLTester):
                               [test_name.partition('.')[0] for test_name in self.specs.tests])]
         self.java_classpath = '.:{}:{}'.format(os.path.join(specs['path_to_solution'], self.CLASS_DIR),
                                                specs['path_to_jdbc_jar'])
+        self.java_server = None
+
+    @property
+    def dataset_major(self):
+        # the java tests use their own connections, which can't see the uncommitted data of a savepoint
+        return False
+
+    def get_cache_files(self, cell):
+        # the java tests run student code as the test user, which could forge cached results
+        return None
+
+    def get_oracle_tables(self, cell):
+        # the java tests compare their own results, only the tables with points are compared here
+        if not isinstance(cell.points, collections.abc.Mapping):
+            return []
+        return [(table_name, None) for table_name in sorted(cell.points)
+                if table_name != MarkusJDBCTest.JAVA_POINTS_KEY]
 
     def init_java(self):
-        javac_command = ['javac', '-cp', self.java_classpath] + self.java_files
-        subprocess.run(javac_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
-                       check=True)
+        # (the solution classes are compiled when initializing the specs, only the submission sources are looked up)
+        compile_java(self.java_files, javac_args=['-cp', self.java_classpath, '-sourcepath', '.'],
+                     cache_dir=self.specs.get(JavacCache.SPECS_KEY))
 
     def run(self):
         try:
@@ -107,16 +276,35 @@ class MarkusJDBCTester(MarkusSQLTester):
             for java_file in self.java_files:
                 if not os.path.isfile(java_file):
                     msg = MarkusJDBCTest.ERROR_MSGS['no_submission'].format(java_file)
-                    print(MarkusTester.error_all(message=msg))
+                    self.write_error_all(message=msg)
                     return
             # check that the submission compiles
             try:
                 self.init_java()
             except subprocess.CalledProcessError as e:
                 msg = MarkusJDBCTest.ERROR_MSGS['bad_javac'].format(e.stdout)
-                print(MarkusTester.error_all(message=msg))
+                self.write_error_all(message=msg)
                 return
         except Exception as e:
-            print(MarkusTester.error_all(message=str(e)))
+            self.write_error_all(message=str(e))
             return
-        super().run()
+        if self.specs.get(self.JAVA_SERVER_KEY, False):
+            # the submission classes are loaded by the server from the current directory, not from its classpath
+            server_classpath = self.java_classpath.partition(':')[2]
+            self.java_server = MarkusJDBCJavaServer(server_classpath, self.specs.get(self.JAVA_TIMEOUT_KEY))
+        try:
+            super().run()
+        finally:
+            if self.java_server is not None:
+                self.java_server.stop()
+                self.java_server = None
+
+
+if __name__ == '__main__':
+    # builds the oracle cache and the dataset copies when initializing the specs
+    if len(sys.argv) != 3:
+        print('Usage: {} specs_file oracle_user'.format(sys.argv[0]))
+        sys.exit(1)
+    tester = MarkusJDBCTester(MarkusTestSpecs(sys.argv[1]))
+    tester.build_oracle_cache(sys.argv[2])
+    tester.build_dataset_copies(sys.argv[2])
@@ -1,34 +1,227 @@
-import collections
+import bisect
+import collections.abc
 import contextlib
 import enum
+import io
 import json
+import marshal
 import os
-import subprocess
-from xml.sax import saxutils
+import resource
 import sys
+import time
 
+# heavier modules (multiprocessing, hashlib, subprocess) are imported on first use, to keep the startup of short test
+# runs fast (see benchmarks/startup.py)
 
-class MarkusTestSpecs(collections.MutableMapping):
+
+class MarkusTestCell:
+    """
+    A cell of the specs matrix: a test run on some data files.
+    """
+
+    __slots__ = ('test_file', 'data_files', 'points', 'test_extra')
+
+    def __init__(self, test_file, data_files, points, test_extra):
+        self.test_file = test_file
+        self.data_files = data_files
+        self.points = points
+        self.test_extra = test_extra
+
+    @property
+    def key(self):
+        """
+        A unique name of this cell in the matrix.
+        """
+        return '{} + {}'.format(self.test_file, MarkusTestSpecs.DATA_FILES_SEPARATOR.join(self.data_files))
+
+
+class MarkusTestPlan:
+    """
+    A compiled specs matrix: the flat list of cells to run, in the deterministic order their results are reported.
+    """
+
+    __slots__ = ('cells', '_keys', '_index')
+
+    def __init__(self, cells):
+        self.cells = cells
+        self._keys = None
+        self._index = None
+
+    @staticmethod
+    def compile(matrix):
+        """
+        Compiles a specs matrix into a test plan.
+        :param matrix: The specs matrix.
+        :return The test plan.
+        """
+        cells = []
+        for test_file in sorted(matrix):
+            test_extra = matrix[test_file].get(MarkusTestSpecs.MATRIX_NONTEST_KEY, {})
+            for data_files in sorted(matrix[test_file].keys()):
+                if data_files == MarkusTestSpecs.MATRIX_NONTEST_KEY:
+                    continue
+                points = matrix[test_file][data_files]
+                cells.append(MarkusTestCell(test_file, data_files.split(MarkusTestSpecs.DATA_FILES_SEPARATOR), points,
+                                            test_extra))
+        return MarkusTestPlan(cells)
+
+    def dump(self):
+        return [(cell.test_file, cell.data_files, cell.points, cell.test_extra) for cell in self.cells]
+
+    @staticmethod
+    def load(dump):
+        return MarkusTestPlan([MarkusTestCell(*cell) for cell in dump])
+
+    @staticmethod
+    def cell_key(cell):
+        return cell.test_file, MarkusTestSpecs.DATA_FILES_SEPARATOR.join(cell.data_files)
+
+    def set_points(self, test_file, data_files, points, test_extra):
+        """
+        Assigns points to a cell of this plan, adding the cell where compile would place it if it is new.
+        :param test_file: The test file of the cell.
+        :param data_files: The data files of the cell, as a matrix key.
+        :param points: The points of the cell.
+        :param test_extra: The extra specs of the test, used if the cell is new.
+        """
+        if self._index is None:
+            self._keys = [self.cell_key(cell) for cell in self.cells]
+            self._index = dict(zip(self._keys, self.cells))
+        key = (test_file, data_files)
+        cell = self._index.get(key)
+        if cell is not None:
+            cell.points = points
+            return
+        cell = MarkusTestCell(test_file, data_files.split(MarkusTestSpecs.DATA_FILES_SEPARATOR), points, test_extra)
+        i = bisect.bisect(self._keys, key)
+        self._keys.insert(i, key)
+        self.cells.insert(i, cell)
+        self._index[key] = cell
+
+    def __iter__(self):
+        return iter(self.cells)
+
+    def __len__(self):
+        return len(self.cells)
+
+
+class MarkusTestSpecs(collections.abc.MutableMapping):
 
     # special keys
     MATRIX_KEY = 'matrix'
     MATRIX_NODATA_KEY = 'nodata'
     MATRIX_NONTEST_KEY = 'extra'
     FEEDBACK_FILE_KEY = 'feedback_file'
+    WORKERS_KEY = 'workers'
+    MAX_TEST_OUTPUT_KEY = 'max_test_output'
+    MAX_RUN_OUTPUT_KEY = 'max_run_output'
+    RESULTS_JSON_KEY = 'results_json'
+    RESULT_CACHE_KEY = 'result_cache'
+    RESULT_CACHE_SIZE_KEY = 'result_cache_size'
+    RUNTIME_HISTORY_KEY = 'runtime_history'
     DATA_FILES_SEPARATOR = ','
+    CACHE_VERSION = 1
 
     def __init__(self, path_to_specs=None):
         if path_to_specs is None:  # try to find specs automagically
             path_to_specs = sys.executable.replace('venvs', 'specs').replace('bin/python3', 'specs.json')
-        with open(path_to_specs, 'r') as specs_open:
-            self._specs = json.loads(specs_open.read())
+        self.path_to_specs = path_to_specs
+        self._plan = None
+        self._load()
         if MarkusTestSpecs.MATRIX_KEY not in self._specs:
             self._specs[MarkusTestSpecs.MATRIX_KEY] = {}
         if MarkusTestSpecs.FEEDBACK_FILE_KEY not in self._specs:
             self._specs[MarkusTestSpecs.FEEDBACK_FILE_KEY] = None
+        if MarkusTestSpecs.WORKERS_KEY not in self._specs:
+            self._specs[MarkusTestSpecs.WORKERS_KEY] = 1
+        if MarkusTestSpecs.MAX_TEST_OUTPUT_KEY not in self._specs:
+            self._specs[MarkusTestSpecs.MAX_TEST_OUTPUT_KEY] = None
+        if MarkusTestSpecs.MAX_RUN_OUTPUT_KEY not in self._specs:
+            self._specs[MarkusTestSpecs.MAX_RUN_OUTPUT_KEY] = None
+        if MarkusTestSpecs.RESULTS_JSON_KEY not in self._specs:
+            self._specs[MarkusTestSpecs.RESULTS_JSON_KEY] = None
+        if MarkusTestSpecs.RESULT_CACHE_KEY not in self._specs:
+            self._specs[MarkusTestSpecs.RESULT_CACHE_KEY] = None
+        if MarkusTestSpecs.RESULT_CACHE_SIZE_KEY not in self._specs:
+            self._specs[MarkusTestSpecs.RESULT_CACHE_SIZE_KEY] = MarkusResultCache.MAX_SIZE_DEFAULT
+        if MarkusTestSpecs.RUNTIME_HISTORY_KEY not in self._specs:
+            self._specs[MarkusTestSpecs.RUNTIME_HISTORY_KEY] = None
+        self._index_matrix()
+
+    @property
+    def cache_file(self):
+        specs_dir, specs_name = os.path.split(self.path_to_specs)
+        return os.path.join(specs_dir, '.{}.cache'.format(specs_name))
+
+    def _load(self):
+        """
+        Loads the specs and their compiled test plan, from the cache if it is still valid or from the specs file
+        otherwise (writing a new cache). The cache is trusted only when owned by the owner of the specs file.
+        """
+        specs_stat = os.stat(self.path_to_specs)
+        cache_key = [MarkusTestSpecs.CACHE_VERSION, specs_stat.st_mtime_ns, specs_stat.st_size]
+        try:
+            with open(self.cache_file, 'rb') as cache_open:
+                if os.fstat(cache_open.fileno()).st_uid == specs_stat.st_uid:
+                    cache = marshal.load(cache_open)
+                    if cache['key'] == cache_key:
+                        self._specs = cache['specs']
+                        self._plan = MarkusTestPlan.load(cache['plan'])
+                        return
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            pass
+        with open(self.path_to_specs, 'r') as specs_open:
+            self._specs = json.loads(specs_open.read())
+        if os.geteuid() != specs_stat.st_uid:
+            return
+        plan = MarkusTestPlan.compile(self._specs.get(MarkusTestSpecs.MATRIX_KEY, {}))
+        cache = {'key': cache_key, 'specs': self._specs, 'plan': plan.dump()}
+        cache_tmp = '{}.{}'.format(self.cache_file, os.getpid())
+        try:
+            with open(cache_tmp, 'wb') as cache_open:
+                marshal.dump(cache, cache_open)
+            os.replace(cache_tmp, self.cache_file)
+        except (OSError, ValueError):  # best effort
+            with contextlib.suppress(OSError):
+                os.remove(cache_tmp)
+            return
+        self._plan = plan
+
+    def _index_matrix(self):
+        """
+        Rebuilds the test->datasets and dataset->tests indexes of the matrix.
+        """
+        self._test_data = {}
+        self._data_tests = {}
+        for test, data_files in self._specs.get(MarkusTestSpecs.MATRIX_KEY, {}).items():
+            for data_file in data_files:
+                self._index_cell(test, data_file)
+
+    def _index_cell(self, test, data_file):
+        if data_file == MarkusTestSpecs.MATRIX_NONTEST_KEY:
+            return
+        self._test_data.setdefault(test, set()).add(data_file)
+        self._data_tests.setdefault(data_file, set()).add(test)
 
     def _setitem(self, key, value):
         self._specs[key] = value
+        if key == MarkusTestSpecs.MATRIX_KEY:
+            self._plan = None
+            self._index_matrix()
+
+    def _set_cell_points(self, test, data_file, points):
+        """
+        Assigns points to a cell of the matrix, creating it if it does not exist yet. The compiled test plan is updated
+        in place rather than compiled again, since the client scripts assign points before every run.
+        """
+        self.matrix.setdefault(test, {})[data_file] = points
+        self._index_cell(test, data_file)
+        if self._plan is None:
+            return
+        if data_file == MarkusTestSpecs.MATRIX_NONTEST_KEY:  # the extra specs of the test's cells changed
+            self._plan = None
+            return
+        self._plan.set_points(test, data_file, points, self.matrix[test].get(MarkusTestSpecs.MATRIX_NONTEST_KEY, {}))
 
     def _set_points(self, _, value):
         """
@@ -36,11 +229,8 @@ class MarkusTestSpecs(collections.MutableMapping):
         Assigns points to the passed tests and datasets, creating them if they don't exist yet.
         """
         for test, data_files in value.items():
-            if test in self.matrix:
-                for data_file, points in data_files.items():
-                    self.matrix[test][data_file] = points
-            else:
-                self.matrix[test] = data_files
+            for data_file, points in data_files.items():
+                self._set_cell_points(test, data_file, points)
 
     def _set_test_points(self, _, value):
         """
@@ -48,33 +238,29 @@ class MarkusTestSpecs(collections.MutableMapping):
         Assigns points to all datasets of the passed tests, creating the tests if they don't exist yet.
         """
         for test, points in value.items():
-            data_files = self.matrix.setdefault(test, {MarkusTestSpecs.MATRIX_NODATA_KEY: {}})
-            for data_file in data_files:
-                if data_file == MarkusTestSpecs.MATRIX_NONTEST_KEY:
-                    continue
-                self.matrix[test][data_file] = points
+            if test not in self.matrix:
+                self._set_cell_points(test, MarkusTestSpecs.MATRIX_NODATA_KEY, points)
+                continue
+            for data_file in tuple(self._test_data.get(test, ())):
+                self._set_cell_points(test, data_file, points)
 
     def _set_data_points(self, _, value):
         """
         SPECS['data_points'] = {'data1': 1, 'data2': 2}
         Assigns points to all existing tests that use the passed datasets, does nothing for tests that don't use them.
         """
-        for test in self.matrix:
-            for data_file, points in value.items():
-                if data_file not in self.matrix[test]:
-                    continue
-                self.matrix[test][data_file] = points
+        for data_file, points in value.items():
+            for test in tuple(self._data_tests.get(data_file, ())):
+                self._set_cell_points(test, data_file, points)
 
     def _set_all_points(self, _, points):
         """
         SPECS['all_points'] = points
         Assigns points to all existing tests and datasets.
         """
-        for test, data_files in self.matrix.items():
-            for data_file in data_files:
-                if data_file == MarkusTestSpecs.MATRIX_NONTEST_KEY:
-                    continue
-                self.matrix[test][data_file] = points
+        for test, data_files in self._test_data.items():
+            for data_file in tuple(data_files):
+                self._set_cell_points(test, data_file, points)
 
     def __setitem__(self, key, value):
         switch = {'points': self._set_points, 'test_points': self._set_test_points,
@@ -87,6 +273,9 @@ class MarkusTestSpecs(collections.MutableMapping):
 
     def __delitem__(self, key):
         del self._specs[key]
+        if key == MarkusTestSpecs.MATRIX_KEY:
+            self._plan = None
+            self._index_matrix()
 
     def __iter__(self):
         return iter(self._specs)
@@ -102,10 +291,354 @@ class MarkusTestSpecs(collections.MutableMapping):
     def feedback_file(self):
         return self[MarkusTestSpecs.FEEDBACK_FILE_KEY]
 
+    @property
+    def plan(self):
+        """
+        The compiled test plan of the current matrix, recompiled only after the matrix changes.
+        """
+        if self._plan is None:
+            self._plan = MarkusTestPlan.compile(self.matrix)
+        return self._plan
+
+    @property
+    def workers(self):
+        return self[MarkusTestSpecs.WORKERS_KEY]
+
+    @property
+    def max_test_output(self):
+        return self[MarkusTestSpecs.MAX_TEST_OUTPUT_KEY]
+
+    @property
+    def max_run_output(self):
+        return self[MarkusTestSpecs.MAX_RUN_OUTPUT_KEY]
+
+    @property
+    def results_json(self):
+        return self[MarkusTestSpecs.RESULTS_JSON_KEY]
+
+    @property
+    def result_cache(self):
+        return self[MarkusTestSpecs.RESULT_CACHE_KEY]
+
+    @property
+    def result_cache_size(self):
+        return self[MarkusTestSpecs.RESULT_CACHE_SIZE_KEY]
+
+    @property
+    def runtime_history(self):
+        return self[MarkusTestSpecs.RUNTIME_HISTORY_KEY]
+
     @property
     def tests(self):
         return self.matrix.keys()
 
+    def get_test_data(self, test):
+        """
+        Gets the datasets used by a test.
+        :param test: The test file.
+        :return A frozenset of data files (empty if the test does not exist).
+        """
+        return frozenset(self._test_data.get(test, ()))
+
+    def get_data_tests(self, data_file):
+        """
+        Gets the tests that use a dataset.
+        :param data_file: The data file.
+        :return A frozenset of test files (empty if no test uses the dataset).
+        """
+        return frozenset(self._data_tests.get(data_file, ()))
+
+
+class MarkusTestResult:
+    """
+    The result of a test, as reported to Markus.
+    """
+
+    __slots__ = ('test_name', 'status', 'output', 'points_earned', 'points_total', 'time', 'usage')
+
+    def __init__(self, test_name, status, output, points_earned, points_total, time=None, usage=None):
+        if points_total < 0:
+            raise ValueError('The test total points must be >= 0')
+        if points_earned < 0:
+            raise ValueError('The test points earned must be >= 0')
+        self.test_name = test_name
+        self.status = status
+        self.output = output
+        self.points_earned = points_earned
+        self.points_total = points_total
+        self.time = time
+        self.usage = usage
+
+    def to_json(self):
+        """
+        Converts this result to a compact json object, without the test output.
+        """
+        return {'name': self.test_name, 'status': self.status.value, 'marks_earned': self.points_earned,
+                'marks_total': self.points_total, 'time': self.time, 'usage': self.usage,
+                'output_length': len(self.output)}
+
+    def __str__(self):
+        return MarkusTest.format_result(self.test_name, self.status, self.output, self.points_earned,
+                                        self.points_total)
+
+
+class MarkusResultWriter:
+    """
+    Writes test results in the format expected by Markus, escaping the test output incrementally instead of building
+    the whole formatted result in memory. The output of each test, and the total output of a run, can be capped: the
+    head and the tail of an output exceeding its cap are kept, and the middle is replaced by a truncation note.
+    Optionally, each result is also written as a json object per line to a separate stream, to be parsed by tools that
+    don't need the test output.
+    """
+
+    CHUNK_SIZE = 65536
+    TRUNCATED_MSG = '\n[... {} characters truncated ...]\n'
+
+    @staticmethod
+    def escape(text):
+        """
+        Escapes text for xml, like xml.sax.saxutils.escape with apostrophes escaped too (without importing the whole
+        xml.sax package, which pulls in urllib).
+        """
+        return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace("'", '&apos;')
+
+    def __init__(self, stream, max_test_output=None, max_run_output=None, json_stream=None):
+        """
+        :param stream: The text stream to write to.
+        :param max_test_output: The max number of output characters kept for a single test, None for no limit.
+        :param max_run_output: The max number of output characters kept for all tests together, None for no limit.
+        :param json_stream: The text stream to write json results to, can be None.
+        """
+        self.stream = stream
+        self.json_stream = json_stream
+        self.max_test_output = max_test_output
+        self.run_output_left = max_run_output
+
+    def write_escaped(self, output, start, end):
+        for i in range(start, end, self.CHUNK_SIZE):
+            chunk = output[i:min(i + self.CHUNK_SIZE, end)]
+            self.stream.write(self.escape(chunk.replace('\x00', '')))
+
+    def write_output(self, output):
+        limit = len(output)
+        if self.max_test_output is not None:
+            limit = min(limit, self.max_test_output)
+        if self.run_output_left is not None:
+            limit = min(limit, self.run_output_left)
+            self.run_output_left -= limit
+        if limit == len(output):
+            self.write_escaped(output, 0, len(output))
+            return
+        head = limit - limit // 2
+        tail = limit // 2
+        self.write_escaped(output, 0, head)
+        self.stream.write(self.escape(self.TRUNCATED_MSG.format(len(output) - limit)))
+        self.write_escaped(output, len(output) - tail, len(output))
+
+    def write_result(self, test_name, status, output, points_earned, points_total):
+        """
+        Writes a test result.
+        :param test_name: The test name
+        :param status: A member of MarkusTest.Status.
+        :param output: The test output.
+        :param points_earned: The points earned by the test.
+        :param points_total: The total points the test could earn.
+        """
+        self.stream.write('\n<test>\n  <name>{}</name>\n  <input></input>\n  <expected></expected>\n  <actual>'
+                          .format(test_name))
+        self.write_output(output)
+        self.stream.write('</actual>\n  <marks_earned>{}</marks_earned>\n  <marks_total>{}</marks_total>\n'
+                          '  <status>{}</status>\n</test>'.format(points_earned, points_total, status.value))
+
+    def write(self, result):
+        """
+        Writes a test result followed by a newline.
+        :param result: A MarkusTestResult, or an already formatted test result.
+        """
+        if isinstance(result, MarkusTestResult):
+            self.write_result(result.test_name, result.status, result.output, result.points_earned,
+                              result.points_total)
+            if self.json_stream is not None:
+                self.json_stream.write(json.dumps(result.to_json()))
+                self.json_stream.write('\n')
+        else:
+            self.stream.write(str(result))
+        self.stream.write('\n')
+
+    def flush(self):
+        self.stream.flush()
+        if self.json_stream is not None:
+            self.json_stream.flush()
+
+
+class MarkusResultCache:
+    """
+    A size-bounded on-disk cache of test results, keyed by the hash of everything a result depends on (see
+    MarkusTester.get_cache_key). Entries are evicted least recently used first.
+    Since student code could forge entries, the cache must only be enabled for testers that don't run student code as
+    the test user (e.g. sql, xquery).
+    """
+
+    CACHE_VERSION = 1
+    MAX_SIZE_DEFAULT = 100 * 1024 * 1024
+
+    def __init__(self, cache_dir, max_size=MAX_SIZE_DEFAULT, salt=b''):
+        """
+        :param cache_dir: The cache directory, created if it does not exist.
+        :param max_size: The max size of all cache entries, in bytes.
+        :param salt: Additional bytes hashed into every key, for what all results of a run depend on.
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.salt = salt
+        self._file_hashes = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def hash_file(self, path):
+        """
+        Hashes the contents of a file, once per run.
+        :param path: The file path.
+        :return The hash digest, or None if the file does not exist.
+        """
+        import hashlib
+
+        if path not in self._file_hashes:
+            try:
+                with open(path, 'rb') as file_open:
+                    file_hash = hashlib.sha256()
+                    for chunk in iter(lambda: file_open.read(65536), b''):
+                        file_hash.update(chunk)
+                    self._file_hashes[path] = file_hash.digest()
+            except OSError:
+                self._file_hashes[path] = None
+        return self._file_hashes[path]
+
+    def get(self, key):
+        """
+        Gets a cached test result, marking it as recently used.
+        :param key: The cache key.
+        :return A (MarkusTestResult, feedback) tuple, or None if the key is not cached.
+        """
+        entry_path = os.path.join(self.cache_dir, key)
+        try:
+            with open(entry_path, 'rb') as entry_open:
+                entry = marshal.load(entry_open)
+            os.utime(entry_path)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if entry[0] != MarkusResultCache.CACHE_VERSION:
+            return None
+        _, test_name, status, output, points_earned, points_total, feedback = entry
+        return MarkusTestResult(test_name, MarkusTest.Status(status), output, points_earned, points_total), feedback
+
+    def put(self, key, result, feedback):
+        """
+        Caches a test result.
+        :param key: The cache key.
+        :param result: The MarkusTestResult.
+        :param feedback: The test feedback, can be None.
+        """
+        entry = (MarkusResultCache.CACHE_VERSION, result.test_name, result.status.value, result.output,
+                 result.points_earned, result.points_total, feedback)
+        entry_path = os.path.join(self.cache_dir, key)
+        entry_tmp = '{}.{}'.format(entry_path, os.getpid())
+        try:
+            with open(entry_tmp, 'wb') as entry_open:
+                marshal.dump(entry, entry_open)
+            os.replace(entry_tmp, entry_path)
+        except (OSError, ValueError):  # best effort
+            with contextlib.suppress(OSError):
+                os.remove(entry_tmp)
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits its max size.
+        """
+        entries = []
+        total_size = 0
+        with os.scandir(self.cache_dir) as entries_it:
+            for entry in entries_it:
+                with contextlib.suppress(OSError):
+                    entry_stat = entry.stat()
+                    entries.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+                    total_size += entry_stat.st_size
+        if total_size <= self.max_size:
+            return
+        for _, entry_size, entry_path in sorted(entries):
+            with contextlib.suppress(OSError):
+                os.remove(entry_path)
+                total_size -= entry_size
+            if total_size <= self.max_size:
+                break
+
+
+class MarkusRuntimeHistory:
+    """
+    The past runtimes of the cells of a matrix, stored in a json file as a moving average per cell.
+    """
+
+    HISTORY_VERSION = 1
+    SMOOTHING = 0.5  # weight of the newest runtime in the moving average
+
+    def __init__(self, history_file):
+        """
+        :param history_file: The history file, created if it does not exist.
+        """
+        self.history_file = history_file
+        self.runtimes = {}
+        try:
+            with open(history_file) as history_open:
+                history = json.load(history_open)
+            if history.get('version') == MarkusRuntimeHistory.HISTORY_VERSION:
+                self.runtimes = history['runtimes']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def get_runtime(self, cell):
+        """
+        Gets the expected runtime of a cell.
+        :param cell: A MarkusTestCell.
+        :return The expected runtime in seconds, or None if the cell never ran.
+        """
+        return self.runtimes.get(cell.key)
+
+    def record(self, cell, result):
+        """
+        Records the runtime of a cell, if its test ran (i.e. the result was not replayed from a cache).
+        :param cell: A MarkusTestCell.
+        :param result: The test result.
+        """
+        if not isinstance(result, MarkusTestResult) or result.time is None:
+            return
+        runtime = self.runtimes.get(cell.key)
+        if runtime is None:
+            self.runtimes[cell.key] = result.time
+        else:
+            self.runtimes[cell.key] = (MarkusRuntimeHistory.SMOOTHING * result.time +
+                                       (1 - MarkusRuntimeHistory.SMOOTHING) * runtime)
+
+    def schedule(self, cells):
+        """
+        Orders cells longest-processing-time-first: cells that never ran come first, since their runtime is unknown.
+        :param cells: A list of MarkusTestCell.
+        :return The list of indexes of the cells, in the order they should start.
+        """
+        def expected(i):
+            runtime = self.get_runtime(cells[i])
+            return (0, 0) if runtime is None else (1, -runtime)
+
+        return sorted(range(len(cells)), key=expected)
+
+    def save(self):
+        history_tmp = '{}.{}'.format(self.history_file, os.getpid())
+        try:
+            with open(history_tmp, 'w') as history_open:
+                json.dump({'version': MarkusRuntimeHistory.HISTORY_VERSION, 'runtimes': self.runtimes}, history_open)
+            os.replace(history_tmp, self.history_file)
+        except OSError:  # best effort
+            with contextlib.suppress(OSError):
+                os.remove(history_tmp)
+
 
 class MarkusTest:
 
@@ -162,17 +695,9 @@ class MarkusTest:
             raise ValueError('The test total points must be >= 0')
         if points_earned < 0:
             raise ValueError('The test points earned must be >= 0')
-        output_escaped = saxutils.escape(output.replace('\x00', ''), entities={"'": '&apos;'})
-        return '''
-<test>
-  <name>{}</name>
-  <input></input>
-  <expected></expected>
-  <actual>{}</actual>
-  <marks_earned>{}</marks_earned>
-  <marks_total>{}</marks_total>
-  <status>{}</status>
-</test>'''.format(test_name, output_escaped, points_earned, points_total, status.value)
+        result_open = io.StringIO()
+        MarkusResultWriter(result_open).write_result(test_name, status, output, points_earned, points_total)
+        return result_open.getvalue()
 
     def format(self, status, output, points_earned):
         """
@@ -181,9 +706,9 @@ class MarkusTest:
         :param output: The test output.
         :param points_earned: The points earned by the test, must be a float >= 0 (can be greater than the test total
                               points when assigning bonus points).
-        :return The formatted test result.
+        :return The test result, a MarkusTestResult.
         """
-        return MarkusTest.format_result(self.test_data_name, status, output, points_earned, self.points_total)
+        return MarkusTestResult(self.test_data_name, status, output, points_earned, self.points_total)
 
     def add_feedback(self, status, feedback='', oracle_solution=None, test_solution=None):
         """
@@ -214,7 +739,7 @@ class MarkusTest:
         feedback to it.
         :param points_bonus: The bonus points, must be a float >= 0.
         :param message: An optional message, will be shown as test output.
-        :return The formatted passed test.
+        :return The passed test result.
         """
         if points_bonus < 0:
             raise ValueError('The test bonus points must be >= 0')
@@ -227,7 +752,7 @@ class MarkusTest:
         """
         Passes this test earning the test total points. If a feedback file is enabled, adds feedback to it.
         :param message: An optional message, will be shown as test output.
-        :return The formatted passed test.
+        :return The passed test result.
         """
         result = self.format(status=self.Status.PASS, output=message, points_earned=self.points_total)
         if self.feedback_open:
@@ -241,7 +766,7 @@ class MarkusTest:
         :param message: The message explaining why the test was not fully passed, will be shown as test output.
         :param oracle_solution: The optional correct solution to be added to the feedback file.
         :param test_solution: The optional student solution to be added to the feedback file.
-        :return The formatted partially passed test.
+        :return The partially passed test result.
         """
         if points_earned <= 0:
             raise ValueError('The test points earned must be > 0')
@@ -259,7 +784,7 @@ class MarkusTest:
         :param message: The failure message, will be shown as test output.
         :param oracle_solution: The optional correct solution to be added to the feedback file.
         :param test_solution: The optional student solution to be added to the feedback file.
-        :return The formatted failed test.
+        :return The failed test result.
         """
         result = self.format(status=self.Status.FAIL, output=message, points_earned=0)
         if self.feedback_open:
@@ -277,7 +802,7 @@ class MarkusTest:
         :param message: The optional message explaining the test outcome, will be shown as test output.
         :param oracle_solution: The optional correct solution to be added to the feedback file.
         :param test_solution: The optional student solution to be added to the feedback file.
-        :return The formatted test.
+        :return The test result.
         """
         if points_earned <= 0:
             return self.failed(message, oracle_solution, test_solution)
@@ -293,7 +818,7 @@ class MarkusTest:
         """
         Err this test. If a feedback file is enabled, adds feedback to it.
         :param message: The error message, will be shown as test output.
-        :return The formatted erred test.
+        :return The erred test result.
         """
         result = self.format(status=self.Status.ERROR, output=message, points_earned=0)
         if self.feedback_open:
@@ -303,16 +828,25 @@ class MarkusTest:
     def run(self):
         """
         Runs this test.
-        :return The formatted test.
+        :return The test result.
         """
         raise NotImplementedError
 
 
 class MarkusTester:
 
+    # specs keys that don't change the result of a test
+    CACHE_IGNORED_KEYS = {MarkusTestSpecs.MATRIX_KEY, MarkusTestSpecs.WORKERS_KEY, MarkusTestSpecs.MAX_TEST_OUTPUT_KEY,
+                          MarkusTestSpecs.MAX_RUN_OUTPUT_KEY, MarkusTestSpecs.RESULTS_JSON_KEY,
+                          MarkusTestSpecs.RESULT_CACHE_KEY, MarkusTestSpecs.RESULT_CACHE_SIZE_KEY,
+                          MarkusTestSpecs.RUNTIME_HISTORY_KEY}
+
     def __init__(self, specs, test_class=MarkusTest):
         self.specs = specs
         self.test_class = test_class
+        self.result_cache = None
+        self.runtime_history = None
+        self.in_batch = False
 
     @staticmethod
     def error_all(message, points_total=0):
@@ -325,8 +859,31 @@ class MarkusTester:
         return MarkusTest.format_result(test_name='All tests', status=MarkusTest.Status.ERROR_ALL, output=message,
                                         points_earned=0, points_total=points_total)
 
+    def write_error_all(self, message, points_total=0, writer=None):
+        """
+        Err all tests of this tester with a single message, like error_all, but through a result writer so that the
+        output caps of the specs apply and an error record is written to the json results.
+        :param message: The error message.
+        :param points_total: The total points the tests could earn, must be a float >= 0.
+        :param writer: The result writer of the run, if it was created already (defaults to a new writer).
+        """
+        result = MarkusTestResult(test_name='All tests', status=MarkusTest.Status.ERROR_ALL, output=message,
+                                  points_earned=0, points_total=points_total)
+        if writer is not None:
+            writer.write(result)
+            return
+        with contextlib.ExitStack() as stack:
+            try:
+                writer = self.create_writer(stack)
+            except OSError:  # the json results can't be written, the error is still reported
+                writer = MarkusResultWriter(sys.stdout, self.specs.max_test_output, self.specs.max_run_output)
+                stack.callback(writer.flush)
+            writer.write(result)
+
     def upload_svn_feedback(self, markus_root_url, repo_name, assignment_name, svn_file_name, svn_user, svn_password,
                             commit_message):
+        import subprocess
+
         markus_server_url, _, markus_instance = markus_root_url.rpartition('/')
         repo_url = '/'.join([markus_server_url, 'svn', markus_instance, repo_name])
         svn_co_command = ['svn', 'co', '--username', svn_user, '--password', svn_password, repo_url]
@@ -342,24 +899,248 @@ class MarkusTester:
                           repo_path]
         subprocess.run(svn_ci_command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
+    def get_test_cells(self):
+        """
+        Gets the cells of the specs matrix to run, in the deterministic order their results are printed.
+        :return A list of MarkusTestCell.
+        """
+        return self.specs.plan.cells
+
+    def run_test(self, cell, feedback_open):
+        """
+        Runs a single cell of the specs matrix.
+        :param cell: A MarkusTestCell.
+        :param feedback_open: The open feedback file, can be None.
+        :return The test result.
+        """
+        test = self.test_class(self, cell.test_file, cell.data_files, cell.points, cell.test_extra, feedback_open)
+        start_time = time.monotonic()
+        start_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        result = test.run()
+        if isinstance(result, MarkusTestResult):
+            end_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            result.time = time.monotonic() - start_time
+            # cpu times of the subprocesses spawned by the test, and the peak memory of the largest one (in KB): the
+            # kernel only tracks the peak of all the subprocesses spawned by this process, which can be attributed to
+            # the test only if it grew during the test (else the test peak is unknown, and reported as None)
+            max_rss = end_usage.ru_maxrss if end_usage.ru_maxrss > start_usage.ru_maxrss else None
+            result.usage = {'user': end_usage.ru_utime - start_usage.ru_utime,
+                            'system': end_usage.ru_stime - start_usage.ru_stime,
+                            'max_rss': max_rss}
+        return result
+
+    def get_cache_files(self, cell):
+        """
+        Gets the files the result of a cell depends on, other than its test file, to compute its result cache key.
+        Testers must override this to support the result cache: the default does not know which submission, data or
+        solution files the test reads, so results are not cached.
+        :param cell: A MarkusTestCell.
+        :return A list of file paths, or None if the result of the cell can't be cached.
+        """
+        return None
+
+    def get_cache_key(self, cell, feedback):
+        """
+        Computes the result cache key of a cell, hashing the cell specs and the contents of the test file and of the
+        other files the cell depends on.
+        :param cell: A MarkusTestCell.
+        :param feedback: Whether the feedback of the test is collected.
+        :return The cache key, or None if the result of the cell can't be cached (see get_cache_files).
+        """
+        import hashlib
+
+        cache_files = self.get_cache_files(cell)
+        if cache_files is None:
+            return None
+        key = hashlib.sha256(self.result_cache.salt)
+        key.update(json.dumps([cell.test_file, cell.data_files, cell.points, cell.test_extra, feedback],
+                              sort_keys=True, default=str).encode())
+        for path in [cell.test_file] + cache_files:
+            key.update(path.encode())
+            key.update(self.result_cache.hash_file(path) or b'\0')
+        return key.hexdigest()
+
+    def create_result_cache(self):
+        """
+        Creates the result cache if enabled in the specs, salted with the tester class and the non-matrix specs.
+        :return The result cache, or None if disabled.
+        """
+        if self.specs.result_cache is None:
+            return None
+        specs = {key: value for key, value in self.specs.items() if key not in self.CACHE_IGNORED_KEYS}
+        salt = '{}.{}'.format(self.__class__.__module__, self.__class__.__qualname__).encode()
+        salt += json.dumps(specs, sort_keys=True, default=str).encode()
+        # reinstalling the specs updates the specs file, and may change solutions that are not in any file
+        salt += str(os.stat(self.specs.path_to_specs).st_mtime_ns).encode()
+        return MarkusResultCache(self.specs.result_cache, self.specs.result_cache_size, salt)
+
+    def run_cell(self, cell, feedback):
+        """
+        Runs a single cell of the specs matrix, or replays its result from the result cache. Erred tests are not
+        cached, since they may be caused by transient problems.
+        :param cell: A MarkusTestCell.
+        :param feedback: Whether the feedback of the test is collected.
+        :return A (test result, feedback) tuple, the feedback is None if not collected.
+        """
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = self.get_cache_key(cell, feedback)
+            cached = self.result_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                return cached
+        feedback_open = io.StringIO() if feedback else None
+        result = self.run_test(cell, feedback_open)
+        feedback = feedback_open.getvalue() if feedback_open is not None else None
+        if (cache_key is not None and isinstance(result, MarkusTestResult) and
+                result.status in (MarkusTest.Status.PASS, MarkusTest.Status.PARTIAL, MarkusTest.Status.FAIL)):
+            self.result_cache.put(cache_key, result, feedback)
+        return result, feedback
+
+    def init_worker(self):
+        """
+        Initializes the state of a forked worker process before it runs any test, when running tests in parallel.
+        Testers holding state that can't be shared across processes (e.g. database connections) must recreate it here.
+        """
+        pass
+
+    def create_writer(self, stack):
+        """
+        Creates the writer of the test results, flushed when the stack exits.
+        :param stack: A contextlib.ExitStack managing the lifetime of the writer.
+        :return The result writer.
+        """
+        results_json = self.specs.results_json
+        if results_json is None:
+            json_open = None
+        elif isinstance(results_json, int):  # an already open file descriptor
+            json_open = stack.enter_context(open(results_json, 'w', closefd=False))
+        else:
+            json_open = stack.enter_context(open(results_json, 'w'))
+        writer = MarkusResultWriter(sys.stdout, self.specs.max_test_output, self.specs.max_run_output, json_open)
+        stack.callback(writer.flush)
+        return writer
+
+    def get_serial_order(self, cells):
+        """
+        Gets the order in which the cells run when running tests serially. Testers can override it to group cells that
+        share some setup work (e.g. the same dataset).
+        :param cells: The list of MarkusTestCell to run.
+        :return An iterable of indexes in the list of cells.
+        """
+        return range(len(cells))
+
+    def run_serial(self, cells, feedback_open, writer):
+        """
+        Runs the cells in this process, in the order given by get_serial_order. The results and the feedback are still
+        printed in the order of the cells, as soon as all the cells before them are done.
+        """
+        done = {}
+        next_i = 0
+        for i in self.get_serial_order(cells):
+            cell = cells[i]
+            result, feedback = self.run_cell(cell, feedback_open is not None)
+            if self.runtime_history is not None:
+                self.runtime_history.record(cell, result)
+            done[i] = (result, feedback)
+            while next_i in done:
+                result, feedback = done.pop(next_i)
+                writer.write(result)
+                if feedback_open is not None:
+                    feedback_open.write(feedback)
+                next_i += 1
+
+    def run_parallel(self, cells, feedback_open, writer, workers):
+        """
+        Runs the cells on a pool of forked worker processes. If a runtime history is enabled, the cells start
+        longest-first to shorten the total runtime. The results and the feedback are still printed in the order of the
+        cells, as if they were run serially.
+        """
+        if self.runtime_history is not None:
+            order = self.runtime_history.schedule(cells)
+        else:
+            order = range(len(cells))
+        import multiprocessing
+
+        sys.stdout.flush()  # forked workers must not inherit (and flush again) pending output
+        context = multiprocessing.get_context('fork')
+        with context.Pool(processes=min(workers, len(cells)), initializer=_init_worker,
+                          initargs=(self, feedback_open is not None)) as pool:
+            async_results = [None] * len(cells)
+            for i in order:
+                async_results[i] = pool.apply_async(_run_worker_test, (cells[i],))
+            for cell, async_result in zip(cells, async_results):
+                result, feedback = async_result.get()
+                if self.runtime_history is not None:
+                    self.runtime_history.record(cell, result)
+                writer.write(result)
+                if feedback_open is not None:
+                    feedback_open.write(feedback)
+
     def run(self):
-        try:
-            with contextlib.ExitStack() as stack:
+        with contextlib.ExitStack() as stack:
+            writer = None
+            try:
                 feedback_open = (stack.enter_context(open(self.specs.feedback_file, 'w'))
                                  if self.specs.feedback_file is not None
                                  else None)
-                for test_file in sorted(self.specs.tests):
-                    test_extra = self.specs.matrix[test_file].get(MarkusTestSpecs.MATRIX_NONTEST_KEY, {})
-                    for data_files in sorted(self.specs.matrix[test_file].keys()):
-                        if data_files == MarkusTestSpecs.MATRIX_NONTEST_KEY:
-                            continue
-                        points = self.specs.matrix[test_file][data_files]
-                        if MarkusTestSpecs.DATA_FILES_SEPARATOR in data_files:
-                            data_files = data_files.split(MarkusTestSpecs.DATA_FILES_SEPARATOR)
-                        else:
-                            data_files = [data_files]
-                        test = self.test_class(self, test_file, data_files, points, test_extra, feedback_open)
-                        xml = test.run()
-                        print(xml)
-        except Exception as e:
-            print(MarkusTester.error_all(message=str(e)))
+                writer = self.create_writer(stack)
+                self.result_cache = self.create_result_cache()
+                if self.specs.runtime_history is not None:
+                    self.runtime_history = MarkusRuntimeHistory(self.specs.runtime_history)
+                cells = self.get_test_cells()
+                if self.specs.workers > 1 and len(cells) > 1:
+                    self.run_parallel(cells, feedback_open, writer, self.specs.workers)
+                else:
+                    self.run_serial(cells, feedback_open, writer)
+                if self.result_cache is not None:
+                    self.result_cache.evict()
+                if self.runtime_history is not None:
+                    self.runtime_history.save()
+            except Exception as e:
+                self.write_error_all(message=str(e), writer=writer)
+
+    def close(self):
+        """
+        Releases the resources kept open across the submissions of a batch run.
+        """
+        pass
+
+    def run_batch(self, submission_dirs, output_file='output.txt'):
+        """
+        Grades many submissions in this process, reusing the tester state (parsed specs, database connections, etc.)
+        across them. Each submission runs in its own directory, where its results are written to an output file instead
+        of stdout. Submissions whose directory or output file can't be opened are skipped, with an error on stderr.
+        :param submission_dirs: The submission directories.
+        :param output_file: The output file name, relative to each submission directory.
+        """
+        cwd = os.getcwd()
+        self.in_batch = True
+        try:
+            for submission_dir in submission_dirs:
+                try:
+                    os.chdir(submission_dir)
+                    with open(output_file, 'w') as output_open, contextlib.redirect_stdout(output_open):
+                        self.run()
+                except OSError as e:  # no output file can be written, the other submissions are still graded
+                    print('Skipping submission {}: {}'.format(submission_dir, e), file=sys.stderr)
+                finally:
+                    os.chdir(cwd)
+        finally:
+            self.in_batch = False
+            self.close()
+
+
+# state of a forked worker process in MarkusTester.run_parallel
+_worker_tester = None
+_worker_feedback = False
+
+
+def _init_worker(tester, feedback):
+    global _worker_tester, _worker_feedback
+    _worker_tester = tester
+    _worker_feedback = feedback
+    tester.init_worker()
+
+
+def _run_worker_test(cell):
+    return _worker_tester.run_cell(cell, _worker_feedback)
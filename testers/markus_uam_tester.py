@@ -33,8 +33,7 @@ class MarkusUAMTester(MarkusTester):
     def __init__(self, specs, test_class=MarkusUAMTest, tester_class=UAMTester, test_ext=''):
         super().__init__(specs, test_class)
         path_to_tests = specs.get('path_to_tests', '.')
-        test_points = {test_file: specs.matrix[test_file][MarkusTestSpecs.MATRIX_NODATA_KEY]
-                       for test_file in specs.tests}
+        test_points = {cell.test_file: cell.points for cell in specs.plan}
         global_timeout = specs.get('global_timeout', UAMTester.GLOBAL_TIMEOUT_DEFAULT)
         test_timeout = specs.get('test_timeout', UAMTester.TEST_TIMEOUT_DEFAULT)
         self.uam_tester = tester_class(specs['path_to_uam'], path_to_tests, test_points, global_timeout, test_timeout,
@@ -42,16 +41,23 @@ class MarkusUAMTester(MarkusTester):
         self.test_ext = test_ext
 
     def run(self):
-        try:
-            with contextlib.ExitStack() as stack:
+        with contextlib.ExitStack() as stack:
+            writer = None
+            try:
                 feedback_open = (stack.enter_context(open(self.specs.feedback_file, 'w'))
                                  if self.specs.feedback_file is not None
                                  else None)
+                writer = self.create_writer(stack)
                 results = self.uam_tester.run()
                 for result in results:
                     points_total = self.uam_tester.get_test_points(result, self.test_ext)
                     test = self.test_class(self, result, points_total, feedback_open)
-                    xml = test.run()
-                    print(xml)
-        except Exception as e:
-            print(MarkusTester.error_all(message=str(e)))
+                    writer.write(test.run())
+            except Exception as e:
+                self.write_error_all(message=str(e), writer=writer)
+            finally:
+                if not self.in_batch:
+                    self.uam_tester.close()
+
+    def close(self):
+        self.uam_tester.close()
@@ -5,7 +5,6 @@ import sys
 
 from markus_pam_tester import MarkusPAMTester
 from markus_tester import MarkusTestSpecs
-from markusapi import Markus
 
 
 if __name__ == '__main__':
@@ -30,13 +29,32 @@ if __name__ == '__main__':
     # or you may want to have a specific timeout per test function; in those cases, you can decorate your test function:
     # @timeout_decorator.timeout(10, use_signals=False)
 
+    # The modules imported once by a fork server, which then runs the tests of each run in a child process forked from
+    # it instead of a new python process (defaults to no fork server if commented out). This removes the python startup
+    # and the import time of heavy course modules from each run, mostly when grading many submissions in a single
+    # process. The preloaded modules can't be replaced by submission files with the same name.
+    # SPECS['pam_preload'] = ['numpy', 'pandas']
+
+    # The max number of output characters reported for a single test and for all tests, keeping the head and the tail of
+    # longer outputs (default to no limit if commented out).
+    # SPECS['max_test_output'] = 10000
+    # SPECS['max_run_output'] = 100000
+
+    # A file name or an open file descriptor where each test result is also written as a json object per line, without
+    # the test output (defaults to no json results if commented out). An error of the whole run is written as a single
+    # result with the 'error_all' status.
+    # SPECS['results_json'] = 'results.ndjson'
+
     # The feedback file name (defaults to no feedback file if commented out).
     # SPECS['feedback_file'] = 'feedback_python.txt'
 
     tester = MarkusPAMTester(specs=SPECS)
     tester.run()
+    # Or grade many submission directories in a single process, writing the results of each to its own output file
+    # tester.run_batch(submission_dirs=sys.argv[6:], output_file='output.txt')
     # Use markus apis if needed
     # if os.path.isfile(SPECS['feedback_file']):
+    #     from markusapi import Markus  # imported only when needed, to keep the startup fast
     #     api = Markus(api_key, root_url)
     #     with open(SPECS['feedback_file']) as feedback_open:
     #         api.upload_feedback_file(assignment_id, group_id, SPECS['feedback_file'], feedback_open.read())
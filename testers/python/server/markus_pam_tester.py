@@ -1,8 +1,13 @@
+import functools
+
 from markus_uam_tester import MarkusUAMTester, MarkusUAMTest
 from pam_tester import PAMTester
 
 
 class MarkusPAMTester(MarkusUAMTester):
 
+    PRELOAD_KEY = 'pam_preload'
+
     def __init__(self, specs, test_class=MarkusUAMTest):
-        super().__init__(specs, test_class, tester_class=PAMTester, test_ext='py')
+        tester_class = functools.partial(PAMTester, preload=specs.get(self.PRELOAD_KEY))
+        super().__init__(specs, test_class, tester_class=tester_class, test_ext='py')
@@ -0,0 +1,186 @@
+"""
+A fork server for pam: a template python process that imports pam and a set of course modules once, then forks a child
+running pam.py for each request, so that neither the interpreter startup nor the imports are paid again by each run.
+It only depends on the standard library, so that it can run as a script from any environment.
+"""
+
+import contextlib
+import importlib
+import json
+import os
+import runpy
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+
+class PAMForkServer:
+    """
+    Drives a fork server process through its stdin and stdout: each request is a json line with the directory and the
+    arguments of a pam run, the server answers with a line with the pid of the child running it, then a line with the
+    child exit code once it is done. The server is started on the first run, and again after it crashes.
+    """
+
+    def __init__(self, path_to_pam, path_to_uam, preload=()):
+        """
+        :param path_to_pam: The path to pam.py.
+        :param path_to_uam: The path to the uam installation.
+        :param preload: The modules imported by the server, besides pam.
+        """
+        self.command = [sys.executable, os.path.abspath(__file__), path_to_pam] + list(preload)
+        self.path_to_pam = path_to_pam
+        self.path_to_uam = path_to_uam
+        self.process = None
+        self._buffer = b''
+
+    def start(self):
+        env = os.environ.copy()  # need to add path to uam libs
+        if 'PYTHONPATH' in env:
+            env['PYTHONPATH'] = '{}:{}'.format(env['PYTHONPATH'], self.path_to_uam)
+        else:
+            env['PYTHONPATH'] = self.path_to_uam
+        # the server must not import anything from a submission directory
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, env=env, cwd=os.path.dirname(self.path_to_pam))
+        self._buffer = b''
+
+    def stop(self):
+        """
+        Stops the server, if running.
+        :return: The server exit code, or None if it was not running.
+        """
+        if self.process is None:
+            return None
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.stdin.close()
+        self.process.stdout.close()
+        returncode = self.process.wait()
+        self.process = None
+        return returncode
+
+    def _read_line(self, deadline):
+        """
+        Reads a line from the server stdout.
+        :raise EOFError: If the server exits first.
+        :raise subprocess.TimeoutExpired: If the deadline passes first.
+        """
+        while b'\n' not in self._buffer:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+            if not ready:
+                raise subprocess.TimeoutExpired(self.command, timeout)
+            data = os.read(self.process.stdout.fileno(), 65536)
+            if not data:
+                raise EOFError
+            self._buffer += data
+        line, _, self._buffer = self._buffer.partition(b'\n')
+        return line
+
+    def run(self, pam_args, timeout=None):
+        """
+        Runs pam in the current directory, in a child forked from the server.
+        :param pam_args: The pam.py arguments.
+        :param timeout: The time limit of the run.
+        :raise subprocess.CalledProcessError: If pam fails, with its output in stdout.
+        :raise subprocess.TimeoutExpired: If pam times out, the child is killed.
+        """
+        if self.process is None or self.process.poll() is not None:
+            self.stop()
+            self.start()
+        pam_command = [sys.executable, self.path_to_pam] + list(pam_args)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with tempfile.NamedTemporaryFile() as output_open:
+            request = {'cwd': os.getcwd(), 'args': list(pam_args), 'output': output_open.name}
+            try:
+                self.process.stdin.write(json.dumps(request).encode() + b'\n')
+                self.process.stdin.flush()
+                pid = int(self._read_line(None))
+                try:
+                    returncode = int(self._read_line(deadline))
+                except subprocess.TimeoutExpired:
+                    with contextlib.suppress(ProcessLookupError):
+                        os.kill(pid, signal.SIGKILL)
+                    self._read_line(None)
+                    raise subprocess.TimeoutExpired(pam_command, timeout)
+            except (OSError, EOFError, ValueError):
+                returncode = self.stop()
+                raise subprocess.CalledProcessError(returncode, pam_command,
+                                                    output='pam fork server exited with code {}'.format(returncode))
+            output_open.seek(0)
+            output = output_open.read().decode(errors='replace')
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, pam_command, output=output)
+
+
+def run_child(path_to_pam, request):
+    """
+    Runs pam.py in a forked child, as if it was the main script of a new python process.
+    :return: The child exit code.
+    """
+    os.chdir(request['cwd'])
+    with open(os.devnull) as devnull_open, open(request['output'], 'w') as output_open:
+        os.dup2(devnull_open.fileno(), 0)
+        os.dup2(output_open.fileno(), 1)
+        os.dup2(output_open.fileno(), 2)
+    # a new process would not share its random state with the other runs
+    if 'random' in sys.modules:
+        sys.modules['random'].seed()
+    if 'numpy.random' in sys.modules:
+        sys.modules['numpy.random'].seed()
+    sys.argv = [path_to_pam] + request['args']
+    try:
+        runpy.run_path(path_to_pam, run_name='__main__')
+        returncode = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            returncode = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            returncode = 1
+    except BaseException:
+        traceback.print_exc()
+        returncode = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return returncode
+
+
+def serve(path_to_pam, preload):
+    """
+    Imports pam and the preloaded modules, then runs pam in a forked child for each request read from stdin.
+    :param path_to_pam: The path to pam.py.
+    :param preload: The modules to import.
+    """
+    # mimic the sys.path of 'python pam.py', without this script dir
+    sys.path[0] = os.path.dirname(os.path.abspath(path_to_pam))
+    for module in ['pam'] + preload:
+        try:
+            importlib.import_module(module)
+        except (Exception, SystemExit):  # pam runs will report it
+            pass
+    requests = sys.stdin.buffer
+    responses = sys.stdout.buffer
+    for line in requests:
+        request = json.loads(line.decode())
+        pid = os.fork()
+        if pid == 0:
+            returncode = 1
+            try:
+                returncode = run_child(path_to_pam, request)
+            finally:
+                os._exit(returncode)
+        responses.write('{}\n'.format(pid).encode())
+        responses.flush()
+        _, status = os.waitpid(pid, 0)
+        returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        responses.write('{}\n'.format(returncode).encode())
+        responses.flush()
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1], sys.argv[2:])
@@ -3,6 +3,7 @@ import shutil
 import subprocess
 import sys
 
+from pam_fork_server import PAMForkServer
 from uam_tester import UAMTester
 
 
@@ -12,20 +13,33 @@ class PAMTester(UAMTester):
     """
 
     def __init__(self, path_to_uam, path_to_tests, test_points, global_timeout=UAMTester.GLOBAL_TIMEOUT_DEFAULT,
-                 test_timeout=UAMTester.TEST_TIMEOUT_DEFAULT, result_filename='result.json'):
+                 test_timeout=UAMTester.TEST_TIMEOUT_DEFAULT, result_filename='result.json', preload=None):
+        """
+        Initializes the basic parameters to run pam (see UAMTester).
+        :param preload: The modules imported once by a fork server, which then runs pam in a forked child for each run
+                        (defaults to no fork server, each run starts a new python process).
+        """
         super().__init__(path_to_uam, path_to_tests, test_points, global_timeout, test_timeout, result_filename)
         self.path_to_pam = os.path.join(path_to_uam, 'pam', 'pam.py')
+        self.fork_server = PAMForkServer(self.path_to_pam, path_to_uam, preload) if preload is not None else None
 
     def generate_results(self):
-        shell_command = [sys.executable, self.path_to_pam, '-t', str(self.test_timeout), self.result_filename]
-        shell_command.extend(sorted(self.test_points.keys()))
+        pam_args = ['-t', str(self.test_timeout), self.result_filename]
+        pam_args.extend(sorted(self.test_points.keys()))
+        if self.path_to_tests != '.':
+            for test_file in self.test_points.keys():
+                shutil.copy(os.path.join(self.path_to_tests, test_file), '.')
+        if self.fork_server is not None:
+            self.fork_server.run(pam_args, timeout=self.global_timeout)
+            return
         env = os.environ.copy()  # need to add path to uam libs
         if 'PYTHONPATH' in env:
             env['PYTHONPATH'] = "{}:{}".format(env['PYTHONPATH'], self.path_to_uam)
         else:
             env['PYTHONPATH'] = self.path_to_uam
-        if self.path_to_tests != '.':
-            for test_file in self.test_points.keys():
-                shutil.copy(os.path.join(self.path_to_tests, test_file), '.')
-        subprocess.run(shell_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True, shell=False,
-                       env=env, timeout=self.global_timeout)
+        subprocess.run([sys.executable, self.path_to_pam] + pam_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                       check=True, shell=False, env=env, timeout=self.global_timeout)
+
+    def close(self):
+        if self.fork_server is not None:
+            self.fork_server.stop()
@@ -6,7 +6,6 @@ import os
 
 from markus_sql_tester import MarkusSQLTester
 from markus_tester import MarkusTestSpecs
-from markusapi import Markus
 
 
 if __name__ == '__main__':
@@ -38,13 +37,45 @@ if __name__ == '__main__':
     # The schema name
     SPECS['schema_name'] = 'ate'
 
+    # The max number of output characters reported for a single test and for all tests, keeping the head and the tail of
+    # longer outputs (default to no limit if commented out).
+    # SPECS['max_test_output'] = 10000
+    # SPECS['max_run_output'] = 100000
+
+    # A file name or an open file descriptor where each test result is also written as a json object per line, without
+    # the test output (defaults to no json results if commented out). An error of the whole run is written as a single
+    # result with the 'error_all' status.
+    # SPECS['results_json'] = 'results.ndjson'
+
+    # A directory where test results are cached, keyed by the submission, test and dataset files: unchanged
+    # submissions replay their cached results instead of running again (defaults to no cache if commented out). The
+    # cache keeps the most recently used results up to a max size in bytes (defaults to 100MB if commented out).
+    # SPECS['result_cache'] = '/path/to/cache'
+    # SPECS['result_cache_size'] = 100 * 1024 * 1024
+
+    # Whether each dataset is loaded once per run into a template schema, which is then cloned for each test instead of
+    # loading the dataset again (defaults to False if commented out). Datasets whose schema contains objects other than
+    # tables, indexes and serial sequences (e.g. views, types, functions, triggers) are always loaded from their files.
+    # SPECS['schema_templates'] = True
+
+    # Whether the tests run grouped by dataset, loading each dataset only once and rolling each test back to it with a
+    # savepoint (defaults to False if commented out). Results are still reported in the usual order.
+    # SPECS['dataset_major'] = True
+
+    # The number of tests run in parallel (defaults to 1 if commented out). Each parallel test process leases its own
+    # test database among the ones in the 'tests' specs, waiting when all of them are in use.
+    # SPECS['workers'] = 4
+
     # The feedback file name (defaults to no feedback file if commented out).
     # SPECS['feedback_file'] = 'feedback_sql.txt'
 
     tester = MarkusSQLTester(specs=SPECS)
     tester.run()
+    # Or grade many submission directories in a single process, writing the results of each to its own output file
+    # tester.run_batch(submission_dirs=sys.argv[6:], output_file='output.txt')
     # Use markus apis if needed
     # if os.path.isfile(SPECS['feedback_file']):
+    #     from markusapi import Markus  # imported only when needed, to keep the startup fast
     #     api = Markus(api_key, root_url)
     #     with open(SPECS['feedback_file']) as feedback_open:
     #         api.upload_feedback_file(assignment_id, group_id, SPECS['feedback_file'], feedback_open.read())
@@ -5,6 +5,8 @@ if [ $# -ne 2 ]; then
     exit 1
 fi
 
+THISSCRIPT=$(readlink -f ${BASH_SOURCE})
+TESTERDIR=$(dirname ${THISSCRIPT})
 WORKINGDIR=$(readlink -f $1)
 SPECSDIR=$(readlink -f $2)
 SPECS=${SPECSDIR}/specs.json
@@ -47,3 +49,5 @@ rm /tmp/ate.sql
 rm -rf ${QUERYDIR}
 echo '[SQL] Updating json specs file'
 sed -i -e "s#/path/to/solution#${SOLUTIONDIR}#g" ${SPECS}
+echo "[SQL] Caching oracle results and converting datasets"
+python3 ${TESTERDIR}/server/markus_sql_tester.py ${SPECS} ${ORACLEUSER}
@@ -1,11 +1,213 @@
+import collections
+import decimal
+import fcntl
 import getpass
+import json
 import os
-import subprocess
-
-import psycopg2
+import pickle
+import re
+import struct
+import sys
+import tempfile
 
 from markus_tester import MarkusTester, MarkusTest, MarkusTestSpecs
 
+# psycopg2 is imported on first use, to keep the startup of short test runs fast
+
+MarkusSQLColumn = collections.namedtuple('MarkusSQLColumn', ['name', 'type_code'])
+
+
+class MarkusSQLOracleCache:
+    """
+    A file of oracle results, keyed by (dataset name, table name, order by). Each result is pickled on its own and is
+    loaded on first use, through an index at the end of the file. The index also holds the fingerprints of the oracle
+    tables, keyed by (dataset name, table name).
+    """
+
+    FILE_NAME = 'oracle.cache'
+    CACHE_VERSION = 2
+
+    def __init__(self, path):
+        self.path = path
+        self._index = None
+        self._fingerprints = None
+        self._results = {}
+
+    def __len__(self):
+        if self._index is None:
+            self._load_index()
+        return len(self._index)
+
+    def _load_index(self):
+        self._index = {}
+        self._fingerprints = {}
+        try:
+            with open(self.path, 'rb') as cache_open:
+                cache_open.seek(-8, os.SEEK_END)
+                cache_open.seek(struct.unpack('<Q', cache_open.read(8))[0])
+                version, index, fingerprints = pickle.load(cache_open)
+        except (OSError, EOFError, ValueError, TypeError, struct.error, pickle.UnpicklingError):
+            return
+        if version == self.CACHE_VERSION:
+            self._index = index
+            self._fingerprints = fingerprints
+
+    def get_fingerprint(self, key):
+        """
+        Gets the fingerprint of an oracle table.
+        :param key: A (dataset name, table name) tuple.
+        :return: The fingerprint (see MarkusSQLTest.fingerprint_query), or None if it is not cached.
+        """
+        if self._fingerprints is None:
+            self._load_index()
+        return self._fingerprints.get(key)
+
+    def get(self, key):
+        """
+        Gets a cached oracle result.
+        :param key: A (dataset name, table name, order by) tuple.
+        :return: A (list of MarkusSQLColumn, list of rows) tuple, or None if the result is not cached.
+        """
+        if key in self._results:
+            return self._results[key]
+        if self._index is None:
+            self._load_index()
+        offset = self._index.get(key)
+        if offset is None:
+            return None
+        with open(self.path, 'rb') as cache_open:
+            cache_open.seek(offset)
+            columns, rows = pickle.load(cache_open)
+        result = ([MarkusSQLColumn(*column) for column in columns], rows)
+        self._results[key] = result
+        return result
+
+    @classmethod
+    def write(cls, path, results, fingerprints):
+        """
+        Writes a cache file.
+        :param path: The cache file path.
+        :param results: A dict of (dataset name, table name, order by) -> (list of MarkusSQLColumn, list of rows).
+        :param fingerprints: A dict of (dataset name, table name) -> fingerprint.
+        """
+        index = {}
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as cache_open:
+            for key, (columns, rows) in results.items():
+                rows = [tuple(bytes(value) if isinstance(value, memoryview) else value for value in row)
+                        for row in rows]
+                try:
+                    entry = pickle.dumps(([(column.name, column.type_code) for column in columns], rows),
+                                         pickle.HIGHEST_PROTOCOL)
+                except (pickle.PicklingError, TypeError, AttributeError):  # left to the oracle database
+                    continue
+                index[key] = cache_open.tell()
+                cache_open.write(entry)
+            index_offset = cache_open.tell()
+            pickle.dump((cls.CACHE_VERSION, index, fingerprints), cache_open, pickle.HIGHEST_PROTOCOL)
+            cache_open.write(struct.pack('<Q', index_offset))
+        os.replace(tmp_path, path)
+
+
+class MarkusSQLDatabasePool:
+    """
+    Leases the test databases of the specs to the test processes running concurrently, through a lock file per database.
+    A run waits for a database only while it holds no other one, so that concurrent runs can't deadlock.
+    """
+
+    LOCK_FILE = 'markus_sql_{}.lock'
+
+    def __init__(self, databases, lock_dir=None):
+        system_user = getpass.getuser()
+        # the database of the current user comes first, it is the one used when there is no contention
+        self.databases = sorted(databases, key=lambda database: database['user'] != system_user)
+        self.lock_dir = lock_dir if lock_dir is not None else tempfile.gettempdir()
+
+    def _lock(self, database, blocking):
+        lock_file = os.path.join(self.lock_dir, self.LOCK_FILE.format(database['database']))
+        try:
+            lock_fd = os.open(lock_file, os.O_RDONLY)
+        except FileNotFoundError:
+            lock_fd = os.open(lock_file, os.O_RDONLY | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(lock_fd)
+            return None
+        return lock_fd
+
+    def lease(self):
+        """
+        Leases a free test database, waiting for the preferred one if all of them are in use.
+        :return: A (database specs, lease) tuple, the lease must be passed to release when done with the database.
+        """
+        leases = self.lease_free(1)
+        if leases:
+            return leases[0]
+        database = self.databases[0]
+        return database, self._lock(database, blocking=True)
+
+    def lease_free(self, max_count):
+        """
+        Leases the test databases that are free, without waiting.
+        :param max_count: The max number of databases to lease.
+        :return: A list of (database specs, lease) tuples, possibly empty.
+        """
+        leases = []
+        for database in self.databases:
+            if len(leases) >= max_count:
+                break
+            lease = self._lock(database, blocking=False)
+            if lease is not None:
+                leases.append((database, lease))
+        return leases
+
+    @staticmethod
+    def release(lease):
+        os.close(lease)
+
+
+class MarkusSQLRows:
+    """
+    A multiset of rows: equal rows are matched in the order they were added, like list.index would find them.
+    """
+
+    def __init__(self, rows):
+        self._rows = {}
+        for row in rows:
+            matches = self._rows.get(row)
+            if matches is None:
+                self._rows[row] = matches = collections.deque()
+            matches.append(row)
+
+    def pop(self, row):
+        """
+        Removes the first row equal to a row.
+        :return: The removed row, or None if there is no equal row left.
+        """
+        try:
+            matches = self._rows.get(row)
+        except TypeError:  # a row that can't be hashed can still equal some rows, found like in MarkusSQLRowList
+            matches = next((matches for matches in self._rows.values() if matches and matches[0] == row), None)
+        if not matches:
+            return None
+        return matches.popleft()
+
+
+class MarkusSQLRowList:
+    """
+    The list equivalent of MarkusSQLRows, for rows that can't be hashed.
+    """
+
+    def __init__(self, rows):
+        self._rows = list(rows)
+
+    def pop(self, row):
+        try:
+            return self._rows.pop(self._rows.index(row))
+        except ValueError:
+            return None
+
 
 class MarkusSQLTest(MarkusTest):
 
@@ -24,6 +226,121 @@ class MarkusSQLTest(MarkusTest):
     }
     SCHEMA_FILE = 'schema.ddl'
     DATASET_DIR = 'datasets'
+    COPY_DIR = 'dataset_copies'
+    COPY_MANIFEST = 'manifest.json'
+    COPY_VERSION = 3
+    # fingerprints the whole catalog but the table rows and statistics: a dataset that changes it (creating or altering
+    # objects in any schema, granting privileges...) does more than the COPY payloads of its tables would replay
+    COPY_CHECK_QUERY = '''
+        SELECT (SELECT md5(string_agg(o::text, ',' ORDER BY o::text)) FROM (
+                    SELECT oid, nspname, nspowner, nspacl FROM pg_namespace) o),
+               (SELECT md5(string_agg(o::text, ',' ORDER BY o::text)) FROM (
+                    SELECT oid, relname, relnamespace, reltype, relowner, relkind, relpersistence, relacl, reloptions,
+                           relhastriggers, relchecks FROM pg_class) o),
+               (SELECT md5(string_agg(o::text, ',' ORDER BY o::text)) FROM (
+                    SELECT attrelid, attnum, attname, atttypid, atttypmod, attnotnull, atthasdef, attisdropped, attacl
+                    FROM pg_attribute) o),
+               (SELECT md5(string_agg(o::text, ',' ORDER BY o::text)) FROM (
+                    SELECT adrelid, adnum, pg_get_expr(adbin, adrelid) FROM pg_attrdef) o),
+               (SELECT md5(string_agg(o::text, ',' ORDER BY o::text)) FROM (
+                    SELECT oid, conname, connamespace, conrelid, contypid, pg_get_constraintdef(oid)
+                    FROM pg_constraint) o),
+               (SELECT md5(string_agg(o::text, ',' ORDER BY o::text)) FROM (
+                    SELECT oid, typname, typnamespace, typowner, typtype, typacl FROM pg_type) o),
+               (SELECT md5(string_agg(o::text, ',' ORDER BY o::text)) FROM (
+                    SELECT oid, enumtypid, enumlabel FROM pg_enum) o),
+               (SELECT md5(string_agg(o::text, ',' ORDER BY o::text)) FROM (
+                    SELECT oid, proname, pronamespace, proowner, proacl, md5(prosrc) FROM pg_proc) o),
+               (SELECT md5(string_agg(o::text, ',' ORDER BY o::text)) FROM (
+                    SELECT oid, tgname, tgrelid, tgfoid, tgenabled FROM pg_trigger) o),
+               (SELECT md5(string_agg(o::text, ',' ORDER BY o::text)) FROM (
+                    SELECT oid, rulename, ev_class, ev_enabled, md5(ev_action::text) FROM pg_rewrite) o),
+               (SELECT md5(string_agg(o::text, ',' ORDER BY o::text)) FROM (
+                    SELECT inhrelid, inhparent, inhseqno FROM pg_inherits) o)'''
+    # counts the triggers and rules of a schema, which would fire again when its dataset is loaded with COPY (the
+    # _RETURN rules of views never fire on inserts)
+    COPY_SCHEMA_CHECK_QUERY = '''
+        SELECT (SELECT count(*) FROM pg_trigger tg JOIN pg_class c ON c.oid = tg.tgrelid
+                WHERE c.relnamespace = n.oid AND NOT tg.tgisinternal)
+             + (SELECT count(*) FROM pg_rewrite r JOIN pg_class c ON c.oid = r.ev_class
+                WHERE c.relnamespace = n.oid AND r.rulename <> '_RETURN')
+        FROM pg_namespace n
+        WHERE n.nspname = %(schema)s'''
+    TEMPLATES_KEY = 'schema_templates'
+    DATASET_SAVEPOINT = 'markus_dataset'
+    FETCH_SAVEPOINT = 'markus_fetch'
+    FETCH_CURSOR = 'markus_results'
+    FETCH_SIZE = 1000
+    # gets the row type of each table, to parse the rows of all tables fetched as arrays of their row types in one query
+    FETCH_TYPES_QUERY = '''
+        SELECT c.relname, c.reltype, t.typarray,
+               ARRAY(SELECT a.attname::text FROM pg_attribute a
+                     WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped ORDER BY a.attnum),
+               ARRAY(SELECT a.atttypid::int FROM pg_attribute a
+                     WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped ORDER BY a.attnum)
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace JOIN pg_type t ON t.oid = c.reltype
+        WHERE n.nspname = %(schema)s AND c.relname = ANY(%(tables)s)'''
+    TEMPLATE_SCHEMA = '{}_template_{}'
+    # counts the objects that the clone query does not copy: anything but tables, indexes and the sequences owned by
+    # columns, user-defined types, functions, triggers and table inheritance
+    TEMPLATE_CHECK_QUERY = '''
+        SELECT (SELECT count(*) FROM pg_class c
+                WHERE c.relnamespace = n.oid AND c.relkind NOT IN ('r', 'i', 'S'))
+             + (SELECT count(*) FROM pg_class s
+                WHERE s.relnamespace = n.oid AND s.relkind = 'S' AND NOT EXISTS (
+                    SELECT 1 FROM pg_depend d
+                    WHERE d.classid = 'pg_class'::regclass AND d.objid = s.oid AND d.deptype IN ('a', 'i')))
+             + (SELECT count(*) FROM pg_type t WHERE t.typnamespace = n.oid AND t.typrelid = 0 AND t.typelem = 0)
+             + (SELECT count(*) FROM pg_proc p WHERE p.pronamespace = n.oid)
+             + (SELECT count(*) FROM pg_trigger tg JOIN pg_class c ON c.oid = tg.tgrelid
+                WHERE c.relnamespace = n.oid AND NOT tg.tgisinternal)
+             + (SELECT count(*) FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE c.relnamespace = n.oid)
+        FROM pg_namespace n
+        WHERE n.nspname = %(schema)s'''
+    # copies the tables of a template schema (with their data, defaults, constraints and indexes), then the sequences
+    # owned by their columns (with their current values) and finally the foreign keys between them
+    TEMPLATE_CLONE_QUERY = '''
+        DO $clone$
+        DECLARE
+            src text := %(template)s;
+            dst text := %(schema)s;
+            r record;
+            fks text[];
+            fk text;
+        BEGIN
+            FOR r IN SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                     WHERE n.nspname = src AND c.relkind = 'r' ORDER BY c.relname LOOP
+                EXECUTE format('CREATE TABLE %%I.%%I (LIKE %%I.%%I INCLUDING ALL)', dst, r.relname, src, r.relname);
+                EXECUTE format('INSERT INTO %%I.%%I %(overriding)s SELECT * FROM %%I.%%I', dst, r.relname, src,
+                               r.relname);
+            END LOOP;
+            FOR r IN SELECT s.relname AS seq, t.relname AS tab, a.attname AS col, d.deptype
+                     FROM pg_class s JOIN pg_namespace n ON n.oid = s.relnamespace
+                     JOIN pg_depend d ON d.classid = 'pg_class'::regclass AND d.objid = s.oid
+                                         AND d.refclassid = 'pg_class'::regclass AND d.deptype IN ('a', 'i')
+                     JOIN pg_class t ON t.oid = d.refobjid
+                     JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = d.refobjsubid
+                     WHERE n.nspname = src AND s.relkind = 'S' LOOP
+                IF r.deptype = 'a' THEN  -- serial column
+                    EXECUTE format('CREATE SEQUENCE %%I.%%I OWNED BY %%I.%%I.%%I', dst, r.seq, dst, r.tab, r.col);
+                    EXECUTE format('ALTER TABLE %%I.%%I ALTER COLUMN %%I SET DEFAULT nextval(%%L::regclass)', dst,
+                                   r.tab, r.col, format('%%I.%%I', dst, r.seq));
+                END IF;
+                EXECUTE format('SELECT setval(pg_get_serial_sequence(%%L, %%L), last_value, is_called) FROM %%I.%%I',
+                               format('%%I.%%I', dst, r.tab), r.col, src, r.seq);
+            END LOOP;
+            PERFORM set_config('search_path', quote_ident(src), true);  -- print the template tables unqualified
+            SELECT array_agg(format('ALTER TABLE %%I.%%I ADD CONSTRAINT %%I %%s', dst, c.relname, con.conname,
+                                    pg_get_constraintdef(con.oid)) ORDER BY c.relname, con.conname)
+            INTO fks
+            FROM pg_constraint con JOIN pg_class c ON c.oid = con.conrelid JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = src AND con.contype = 'f';
+            PERFORM set_config('search_path', quote_ident(dst), true);
+            FOREACH fk IN ARRAY coalesce(fks, '{}') LOOP
+                EXECUTE fk;
+            END LOOP;
+        END
+        $clone$'''
 
     def __init__(self, tester, test_file, data_files, points, test_extra, feedback_open):
         super().__init__(tester, test_file, data_files, points, test_extra, feedback_open)
@@ -36,10 +353,16 @@ class MarkusSQLTest(MarkusTest):
         self.oracle_cursor = tester.oracle_cursor
         self.test_connection = tester.test_connection
         self.test_cursor = tester.test_cursor
+        self.oracle_columns = None
+        self.test_columns = None
+        self.test_count = None
         self.path_to_solution = tester.specs['path_to_solution']
         self.schema_name = tester.specs['schema_name']
 
-    def select_query(self, schema_name, table_name, order_by=None):
+    @staticmethod
+    def select_query(schema_name, table_name, order_by=None):
+        import psycopg2
+
         query = 'SELECT * FROM %(schema)s.%(table)s'
         query_vars = {'schema': psycopg2.extensions.AsIs(schema_name),
                       'table': psycopg2.extensions.AsIs(table_name)}
@@ -49,51 +372,360 @@ class MarkusSQLTest(MarkusTest):
 
         return query, query_vars
 
+    @staticmethod
+    def fingerprint_query(schema_name, table_names):
+        """
+        Gets the query computing the fingerprints of tables, in a single round trip. The fingerprint of a table is its
+        row count, an order-insensitive hash of its rows, its column names and its column type oids. The rows are hashed
+        as text, with the settings that make the text of equal values equal.
+        :param schema_name: The schema of the tables.
+        :param table_names: The table names.
+        :return: A (query, query vars) tuple; the query returns a (table name, fingerprint...) row per table.
+        """
+        import psycopg2
+
+        query = '''
+            SET LOCAL extra_float_digits = 3;
+            SET LOCAL TimeZone = 'UTC';
+            SET LOCAL DateStyle = 'ISO, MDY';
+            SET LOCAL IntervalStyle = 'postgres';'''
+        table_query = '''
+            SELECT %(name{0})s, count(*), md5(coalesce(string_agg(row_hash, '' ORDER BY row_hash), '')),
+                   ARRAY(SELECT a.attname::text FROM pg_attribute a
+                         WHERE a.attrelid = %(relation{0})s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+                         ORDER BY a.attnum),
+                   ARRAY(SELECT a.atttypid::int FROM pg_attribute a
+                         WHERE a.attrelid = %(relation{0})s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+                         ORDER BY a.attnum)
+            FROM (SELECT md5(r::text) AS row_hash FROM %(schema)s.%(table{0})s r) row_hashes'''
+        query += '\n            UNION ALL'.join(table_query.format(i) for i in range(len(table_names)))
+        query_vars = {'schema': psycopg2.extensions.AsIs(schema_name)}
+        for i, table_name in enumerate(table_names):
+            query_vars['name{}'.format(i)] = table_name
+            query_vars['table{}'.format(i)] = psycopg2.extensions.AsIs(table_name)
+            query_vars['relation{}'.format(i)] = '{}.{}'.format(schema_name, table_name)
+
+        return query, query_vars
+
+    def check_fingerprints(self, table_names):
+        """
+        Checks which test tables have the same fingerprint as their oracle tables, which means that their rows match
+        regardless of their order. This is much cheaper than fetching and comparing the rows, but it can't tell why they
+        don't match.
+        :param table_names: The table names.
+        :return: The set of table names whose fingerprints match; tables whose oracle fingerprint is not cached never
+                 match, and no table matches if any test table can't be fingerprinted (e.g. it does not exist).
+        """
+        import psycopg2
+
+        oracle_fingerprints = {}
+        for table_name in table_names:
+            oracle_fingerprint = self.tester.oracle_cache.get_fingerprint((self.data_name, table_name))
+            if oracle_fingerprint is not None:
+                oracle_fingerprints[table_name] = oracle_fingerprint
+        if not oracle_fingerprints:
+            return set()
+        query, query_vars = self.fingerprint_query(schema_name=self.schema_name,
+                                                   table_names=sorted(oracle_fingerprints))
+        # (the settings of the query survive a release of the savepoint, they are undone by rolling back to it)
+        self.test_cursor.execute('SAVEPOINT {}'.format(self.FETCH_SAVEPOINT))
+        try:
+            self.test_cursor.execute(query, query_vars)
+            test_fingerprints = self.test_cursor.fetchall()
+        except psycopg2.Error:  # the full comparison reports the error
+            return set()
+        finally:
+            self.test_cursor.execute('ROLLBACK TO SAVEPOINT {0}; RELEASE SAVEPOINT {0}'.format(self.FETCH_SAVEPOINT))
+        return {table_name for table_name, *test_fingerprint in test_fingerprints
+                if test_fingerprint == oracle_fingerprints[table_name]}
+
+    def check_fingerprint(self, table_name):
+        """
+        Checks whether a test table has the same fingerprint as its oracle table (see check_fingerprints).
+        """
+        return table_name in self.check_fingerprints([table_name])
+
     def get_oracle_results(self, table_name, order_by=None):
+        cached = self.tester.oracle_cache.get((self.data_name, table_name, order_by))
+        if cached is not None:
+            self.oracle_columns, oracle_results = cached
+            return oracle_results
+        if self.oracle_connection is None:  # not connected when the oracle cache is used
+            self.tester.init_oracle_db()
+            self.oracle_connection = self.tester.oracle_connection
+            self.oracle_cursor = self.tester.oracle_cursor
         query, query_vars = self.select_query(schema_name=self.data_name, table_name=table_name, order_by=order_by)
-        self.oracle_cursor.execute(query, query_vars)
+        oracle_results, _, self.oracle_columns = self.fetch_query(self.oracle_connection, query, query_vars)
         self.oracle_connection.commit()
-        oracle_results = self.oracle_cursor.fetchall()
 
         return oracle_results
 
-    def set_test_schema(self, data_file):
+    def create_schema(self, schema_name):
+        import psycopg2
+
         self.test_cursor.execute('DROP SCHEMA IF EXISTS %(schema)s CASCADE',
-                                 {'schema': psycopg2.extensions.AsIs(self.schema_name)})
+                                 {'schema': psycopg2.extensions.AsIs(schema_name)})
         self.test_cursor.execute('CREATE SCHEMA %(schema)s',
-                                 {'schema': psycopg2.extensions.AsIs(self.schema_name)})
+                                 {'schema': psycopg2.extensions.AsIs(schema_name)})
         self.test_cursor.execute('SET search_path TO %(schema)s',
-                                 {'schema': psycopg2.extensions.AsIs(self.schema_name)})
+                                 {'schema': psycopg2.extensions.AsIs(schema_name)})
+
+    @classmethod
+    def get_dataset_sources(cls, path_to_solution, data_file):
+        """
+        Gets the (size, modification time) of the schema and dataset files, to check that a dataset copy is up to date.
+        """
+        sources = []
+        for source in [os.path.join(path_to_solution, cls.SCHEMA_FILE),
+                       os.path.join(path_to_solution, cls.DATASET_DIR, data_file)]:
+            source_stat = os.stat(source)
+            sources.append([source_stat.st_size, source_stat.st_mtime_ns])
+        return sources
+
+    def load_dataset_copy(self, data_file):
+        """
+        Loads a dataset with COPY from the table payloads exported by MarkusSQLTester.build_dataset_copies.
+        :param data_file: The dataset file name.
+        :return: True if the dataset was loaded, False if it has no up-to-date copy.
+        """
+        import psycopg2
+
+        copy_dir = os.path.join(self.path_to_solution, self.COPY_DIR, data_file)
+        try:
+            with open(os.path.join(copy_dir, self.COPY_MANIFEST)) as manifest_open:
+                manifest = json.load(manifest_open)
+        except (OSError, ValueError):
+            return False
+        if (manifest.get('version') != self.COPY_VERSION or
+                manifest.get('sources') != self.get_dataset_sources(self.path_to_solution, data_file)):
+            return False
+        for i, table_name in enumerate(manifest['tables']):
+            with open(os.path.join(copy_dir, '{}.copy'.format(i)), 'rb') as copy_open:
+                self.test_cursor.copy_expert('COPY {} FROM STDIN'.format(
+                    psycopg2.extensions.quote_ident(table_name, self.test_cursor)), copy_open)
+        for sequence_name, (last_value, is_called) in manifest['sequences'].items():
+            self.test_cursor.execute('SELECT setval(%s, %s, %s)', (
+                psycopg2.extensions.quote_ident(sequence_name, self.test_cursor), last_value, is_called))
+        return True
+
+    def load_schema(self, data_file):
         with open(os.path.join(self.path_to_solution, self.SCHEMA_FILE)) as schema_open:
             schema = schema_open.read()
             self.test_cursor.execute(schema)
-        if data_file != MarkusTestSpecs.MATRIX_NODATA_KEY:
+        if data_file != MarkusTestSpecs.MATRIX_NODATA_KEY and not self.load_dataset_copy(data_file):
             with open(os.path.join(self.path_to_solution, self.DATASET_DIR, data_file)) as data_open:
                 data = data_open.read()
                 self.test_cursor.execute(data)
+
+    def get_schema_template(self, data_file):
+        """
+        Gets the template schema of a dataset, building it the first time it is needed in a run.
+        :param data_file: The dataset file name.
+        :return: The template schema name, or None if the schema contains objects that can't be cloned.
+        """
+        import psycopg2
+
+        templates = self.tester.schema_templates
+        if data_file not in templates:
+            template_name = self.TEMPLATE_SCHEMA.format(
+                self.schema_name, re.sub(r'\W', '_', os.path.splitext(data_file)[0])).lower()
+            self.create_schema(template_name)
+            self.load_schema(data_file)
+            self.test_cursor.execute(self.TEMPLATE_CHECK_QUERY, {'schema': template_name})
+            if self.test_cursor.fetchone()[0] > 0:
+                self.test_cursor.execute('DROP SCHEMA %(schema)s CASCADE',
+                                         {'schema': psycopg2.extensions.AsIs(template_name)})
+                template_name = None
+            self.test_connection.commit()
+            templates[data_file] = template_name
+        return templates[data_file]
+
+    def clone_schema(self, template_name):
+        import psycopg2
+
+        overriding = 'OVERRIDING SYSTEM VALUE' if self.test_connection.server_version >= 100000 else ''
+        self.test_cursor.execute(self.TEMPLATE_CLONE_QUERY, {'template': template_name, 'schema': self.schema_name,
+                                                             'overriding': psycopg2.extensions.AsIs(overriding)})
+
+    def set_test_schema(self, data_file):
+        template_name = None
+        if self.tester.specs.get(self.TEMPLATES_KEY, False):
+            template_name = self.get_schema_template(data_file)
+        self.create_schema(self.schema_name)
+        if template_name is not None:
+            self.clone_schema(template_name)
+        else:
+            self.load_schema(data_file)
         self.test_connection.commit()
 
-    def get_test_results(self, table_name, sql_file=None, sql_order_file=None):
+    def reset_test_schema(self, data_file):
+        """
+        Resets the test schema to a dataset before running the test. In dataset-major mode, the dataset is loaded only
+        if the previous test used a different one, then a savepoint is set to roll the test back to it afterwards.
+        :param data_file: The dataset file name.
+        """
+        if not self.tester.dataset_major:
+            self.set_test_schema(data_file)
+            return
+        if self.tester.loaded_dataset != data_file:
+            self.test_connection.rollback()
+            self.tester.loaded_dataset = None
+            self.set_test_schema(data_file)
+            self.tester.loaded_dataset = data_file
+        self.test_cursor.execute('SAVEPOINT {}'.format(self.DATASET_SAVEPOINT))
+
+    def release_test_schema(self):
+        """
+        Ends the transaction of the test. In dataset-major mode, the test is rolled back to the pristine dataset; if the
+        submission ended the transaction by itself, the dataset is loaded again for the next test.
+        """
+        import psycopg2
+
+        if not self.tester.dataset_major:
+            self.test_connection.commit()
+            return
+        try:
+            self.test_cursor.execute('ROLLBACK TO SAVEPOINT {0}; RELEASE SAVEPOINT {0}'.format(self.DATASET_SAVEPOINT))
+        except psycopg2.Error:
+            self.test_connection.rollback()
+            self.tester.loaded_dataset = None
+
+    def fetch_rows(self, connection, cursor, limit=None):
+        """
+        Fetches the rows of a query in batches.
+        :param connection: The connection of the cursor.
+        :param cursor: The cursor that executed the query, named (server-side) or not.
+        :param limit: The max number of rows to fetch, the others are only counted (defaults to no limit).
+        :return: A (list of rows, row count) tuple.
+        """
+        rows = []
+        while limit is None or len(rows) < limit:
+            size = self.FETCH_SIZE if limit is None else min(self.FETCH_SIZE, limit - len(rows))
+            batch = cursor.fetchmany(size)
+            rows.extend(batch)
+            if len(batch) < size:
+                return rows, len(rows)
+        if cursor.name is None:  # the rows are client-side already
+            return rows, cursor.rowcount
+        with connection.cursor() as move_cursor:
+            move_cursor.execute('MOVE FORWARD ALL IN "{}"'.format(cursor.name))
+            return rows, len(rows) + move_cursor.rowcount
+
+    def fetch_query(self, connection, query, query_vars=None, limit=None):
+        """
+        Runs a query and fetches its rows through a server-side cursor, falling back to a client-side cursor when the
+        query can't be declared as a cursor (e.g. it contains more than one statement).
+        :return: A (list of rows, row count, column descriptions) tuple.
+        """
+        import psycopg2
+
+        with connection.cursor() as savepoint_cursor:
+            savepoint_cursor.execute('SAVEPOINT {}'.format(self.FETCH_SAVEPOINT))
+            cursor = connection.cursor(name=self.FETCH_CURSOR)
+            try:
+                cursor.execute(query, query_vars)
+                rows, count = self.fetch_rows(connection, cursor, limit)
+                columns = cursor.description
+                cursor.close()
+                savepoint_cursor.execute('RELEASE SAVEPOINT {}'.format(self.FETCH_SAVEPOINT))
+                return rows, count, columns
+            except psycopg2.Error:
+                savepoint_cursor.execute('ROLLBACK TO SAVEPOINT {0}; RELEASE SAVEPOINT {0}'.format(
+                    self.FETCH_SAVEPOINT))
+        with connection.cursor() as cursor:
+            cursor.execute(query, query_vars)
+            rows, count = self.fetch_rows(connection, cursor, limit)
+            return rows, count, cursor.description
+
+    def fetch_tables(self, connection, schema_name, table_names, limits=None):
+        """
+        Fetches the rows of many tables in a single query, each table as an array of its row type, instead of a query
+        per table. The row types are parsed with the same casters as the columns of a query on a single table.
+        :param connection: The connection to fetch from.
+        :param schema_name: The schema of the tables.
+        :param table_names: The table names.
+        :param limits: A dict of table name -> max number of rows to fetch, the others are only counted (defaults to no
+                       limit).
+        :return: A dict of table name -> (list of rows, row count, list of MarkusSQLColumn).
+        :raise LookupError: If a table does not exist.
+        :raise psycopg2.Error: If the tables can't be fetched, the transaction is rolled back to before the query.
+        """
+        import psycopg2
+        import psycopg2.extras
+
+        limits = limits or {}
+        with connection.cursor() as cursor:
+            cursor.execute('SAVEPOINT {}'.format(self.FETCH_SAVEPOINT))
+            try:
+                cursor.execute(self.FETCH_TYPES_QUERY, {'schema': schema_name, 'tables': list(table_names)})
+                table_types = {table_name: table_type for table_name, *table_type in cursor.fetchall()}
+                query_parts = []
+                query_vars = {'schema': psycopg2.extensions.AsIs(schema_name)}
+                for i, table_name in enumerate(table_names):
+                    if table_name not in table_types:
+                        raise LookupError("Table '{}' not found".format(table_name))
+                    type_oid, array_oid, column_names, column_types = table_types[table_name]
+                    caster = psycopg2.extras.CompositeCaster(table_name, type_oid,
+                                                             list(zip(column_names, column_types)),
+                                                             array_oid=array_oid, schema=schema_name)
+                    psycopg2.extensions.register_type(caster.typecaster, cursor)
+                    psycopg2.extensions.register_type(caster.array_typecaster, cursor)
+                    query_parts.append('(SELECT count(*) FROM %(schema)s.%(table{0})s), '
+                                       'ARRAY(SELECT r FROM %(schema)s.%(table{0})s r LIMIT %(limit{0})s)'.format(i))
+                    query_vars['table{}'.format(i)] = psycopg2.extensions.AsIs(
+                        psycopg2.extensions.quote_ident(table_name, cursor))
+                    query_vars['limit{}'.format(i)] = limits.get(table_name)
+                cursor.execute('SELECT {}'.format(', '.join(query_parts)), query_vars)
+                row = cursor.fetchone()
+            except (psycopg2.Error, LookupError):
+                cursor.execute('ROLLBACK TO SAVEPOINT {0}; RELEASE SAVEPOINT {0}'.format(self.FETCH_SAVEPOINT))
+                raise
+            cursor.execute('RELEASE SAVEPOINT {}'.format(self.FETCH_SAVEPOINT))
+        tables = {}
+        for i, table_name in enumerate(table_names):
+            _, _, column_names, column_types = table_types[table_name]
+            rows = [tuple(table_row) for table_row in row[2 * i + 1]]  # not the named tuples of the row type
+            columns = [MarkusSQLColumn(*column) for column in zip(column_names, column_types)]
+            tables[table_name] = (rows, row[2 * i], columns)
+        return tables
+
+    def run_submission(self, sql_file):
+        with open(sql_file) as sql_open:
+            sql = sql_open.read()
+            self.test_cursor.execute(sql)
+
+    def get_test_results(self, table_name, sql_file=None, sql_order_file=None, limit=None):
         if sql_file is not None:
-            with open(sql_file) as sql_open:
-                sql = sql_open.read()
-                self.test_cursor.execute(sql)
+            self.run_submission(sql_file)
         if sql_order_file is not None:
             with open(sql_order_file) as sql_order_open:
-                sql = sql_order_open.read()
-                self.test_cursor.execute(sql)
+                query = sql_order_open.read()
+                query_vars = None
         else:
             query, query_vars = self.select_query(schema_name=self.schema_name, table_name=table_name)
-            self.test_cursor.execute(query, query_vars)
-        self.test_connection.commit()
-        test_results = self.test_cursor.fetchall()
+        test_results, self.test_count, self.test_columns = self.fetch_query(
+            self.test_connection, query, query_vars, limit)
+        if not self.tester.dataset_major:  # else rolled back by release_test_schema
+            self.test_connection.commit()
 
         return test_results
 
-    def check_results(self, oracle_results, test_results, order_on=True):
+    @staticmethod
+    def index_rows(rows):
+        """
+        Indexes rows as a multiset, to match them regardless of their order.
+        :param rows: The rows.
+        :return: A MarkusSQLRows multiset, or a MarkusSQLRowList if some rows can't be hashed (e.g. they have arrays).
+        """
+        try:
+            return MarkusSQLRows(rows)
+        except TypeError:
+            return MarkusSQLRowList(rows)
 
-        oracle_columns = self.oracle_cursor.description
-        test_columns = self.test_cursor.description
+    def check_results(self, oracle_results, test_results, order_on=True, test_count=None):
+
+        oracle_columns = self.oracle_columns
+        test_columns = self.test_columns
 
         # check 1: column count
         oracle_num_columns = len(oracle_columns)
@@ -121,20 +753,20 @@ class MarkusSQLTest(MarkusTest):
 
         # check 4: row count
         oracle_num_results = len(oracle_results)
-        test_num_results = len(test_results)
+        test_num_results = len(test_results) if test_count is None else test_count
         if oracle_num_results != test_num_results:
             return (MarkusTest.Status.FAIL,
                     self.ERROR_MSGS['bad_row_count'].format(oracle_num_results, test_num_results))
 
+        if not order_on:
+            test_rows = self.index_rows(test_results)
         for i, oracle_row in enumerate(oracle_results):
             if order_on:
                 test_row = test_results[i]
             else:
                 # check 5, unordered variant: row contents
-                try:
-                    t = test_results.index(oracle_row)
-                    test_row = test_results.pop(t)
-                except ValueError:
+                test_row = test_rows.pop(oracle_row)
+                if test_row is None:
                     return (MarkusTest.Status.FAIL,
                             self.ERROR_MSGS['bad_row_content_no_order'].format(oracle_row))
             checked_column_types = []
@@ -164,28 +796,43 @@ class MarkusSQLTest(MarkusTest):
         # all good
         return MarkusTest.Status.PASS, ''
 
-    def get_psql_dump(self, table_name, oracle_order_by=None, test_order_file=None):
-        oracle_query, oracle_vars = self.select_query(schema_name=self.data_name, table_name=table_name,
-                                                      order_by=oracle_order_by)
-        oracle_command = ['psql', '-U', self.user_name, '-d', self.oracle_database, '-h', 'localhost', '-c',
-                          self.oracle_cursor.mogrify(oracle_query, oracle_vars)]
-        test_command = ['psql', '-U', self.user_name, '-d', self.test_database, '-h', 'localhost', '-c']
-        if test_order_file is not None:
-            test_query = 'SET search_path TO %(schema)s;'
-            test_vars = {'schema': psycopg2.extensions.AsIs(self.schema_name)}
-            with open(test_order_file) as test_order_open:
-                test_query += test_order_open.read()
-        else:
-            test_query, test_vars = self.select_query(schema_name=self.schema_name, table_name=table_name)
-        test_command.extend([self.test_cursor.mogrify(test_query, test_vars)])
-        env = os.environ.copy()
-        env['PGPASSWORD'] = self.user_password
-        oracle_proc = subprocess.run(oracle_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True,
-                                     env=env, universal_newlines=True)
-        test_proc = subprocess.run(test_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True, env=env,
-                                   universal_newlines=True)
+    @staticmethod
+    def format_value(value):
+        """
+        Formats a value like psql.
+        :return: A (formatted value, whether it is right-aligned) tuple.
+        """
+        if value is None:
+            return '', False
+        if isinstance(value, bool):
+            return ('t' if value else 'f'), False
+        if isinstance(value, (int, float, decimal.Decimal)):
+            return str(value), True
+        if isinstance(value, (bytes, memoryview)):
+            return '\\x{}'.format(bytes(value).hex()), False
+        return str(value), False
 
-        return oracle_proc.stdout, test_proc.stdout
+    @staticmethod
+    def format_table(columns, rows, count=None):
+        """
+        Formats query results like a psql table.
+        :param columns: The column descriptions of the query.
+        :param rows: The rows of the query.
+        :param count: The row count of the query, if only its first rows are passed (defaults to the number of rows).
+        :return: The formatted table.
+        """
+        names = [column.name for column in columns]
+        values = [[MarkusSQLTest.format_value(value) for value in row] for row in rows]
+        widths = [max([len(name)] + [len(row[i][0]) for row in values]) for i, name in enumerate(names)]
+        lines = [' {} '.format(' | '.join(name.center(width) for name, width in zip(names, widths))),
+                 '-{}-'.format('-+-'.join('-' * width for width in widths))]
+        lines.extend(' {} '.format(' | '.join(value.rjust(width) if right else value.ljust(width)
+                                               for (value, right), width in zip(row, widths)))
+                     for row in values)
+        count = len(values) if count is None else count
+        lines.append('({} row{}{})'.format(count, '' if count == 1 else 's',
+                                           ', {} shown'.format(len(values)) if count > len(values) else ''))
+        return '\n'.join(lines) + '\n\n'
 
     def run(self):
 
@@ -202,46 +849,253 @@ class MarkusSQLTest(MarkusTest):
                 message = self.ERROR_MSGS['no_submission_order'].format(test_order_file)
                 return self.error(message)
         try:
-            # drop and recreate test schema + dataset, then fetch and compare results
-            self.set_test_schema(self.data_file)
-            test_results = self.get_test_results(table_name=self.test_name, sql_file=self.test_file,
-                                                 sql_order_file=test_order_file)
+            # reset the test schema to the dataset, then fetch and compare results
+            self.reset_test_schema(self.data_file)
+            self.run_submission(self.test_file)
+            if oracle_order_by is None and self.check_fingerprint(self.test_name):
+                return self.passed()
+            # (the oracle results come first, to fetch at most one test row more than them)
             oracle_results = self.get_oracle_results(table_name=self.test_name, order_by=oracle_order_by)
-            status, message = self.check_results(oracle_results, test_results, order_on=(oracle_order_by is not None))
+            test_results = self.get_test_results(table_name=self.test_name, sql_order_file=test_order_file,
+                                                 limit=len(oracle_results) + 1)
+            status, message = self.check_results(oracle_results, test_results, order_on=(oracle_order_by is not None),
+                                                 test_count=self.test_count)
             if status is MarkusTest.Status.PASS:
                 return self.passed()
             else:
-                oracle_solution, test_solution = self.get_psql_dump(table_name=self.test_name,
-                                                                    oracle_order_by=oracle_order_by,
-                                                                    test_order_file=test_order_file)
+                oracle_solution = self.format_table(self.oracle_columns, oracle_results)
+                test_solution = self.format_table(self.test_columns, test_results, self.test_count)
                 return self.failed(message, oracle_solution, test_solution)
         except Exception as e:
-            self.oracle_connection.commit()
-            self.test_connection.commit()
+            if self.oracle_connection is not None:
+                self.oracle_connection.commit()
             return self.error(message=str(e))
+        finally:
+            self.release_test_schema()
 
 
 class MarkusSQLTester(MarkusTester):
 
+    DATASET_MAJOR_KEY = 'dataset_major'
+
     def __init__(self, specs, test_class=MarkusSQLTest):
         super().__init__(specs, test_class)
-        system_user = getpass.getuser()
-        for tester_spec in specs['tests']:
-            if tester_spec['user'] == system_user:
-                self.test_database = tester_spec['database']
-                self.user_name = tester_spec['user']
-                self.user_password = tester_spec['password']
-                break
+        self.database_pool = MarkusSQLDatabasePool(specs['tests'])
+        self.database_lease = None
+        self.worker_databases = None
+        self.test_database = None
+        self.user_name = None
+        self.user_password = None
         self.oracle_database = specs['oracle_database']
         self.oracle_connection = None
         self.oracle_cursor = None
         self.test_connection = None
         self.test_cursor = None
+        self.schema_templates = {}
+        self.loaded_dataset = None
+        self.oracle_cache = MarkusSQLOracleCache(os.path.join(specs['path_to_solution'],
+                                                              MarkusSQLOracleCache.FILE_NAME))
+
+    @property
+    def dataset_major(self):
+        return self.specs.get(self.DATASET_MAJOR_KEY, False)
+
+    def get_serial_order(self, cells):
+        if not self.dataset_major:
+            return super().get_serial_order(cells)
+        return sorted(range(len(cells)), key=lambda i: cells[i].data_files[0])
+
+    def get_cache_files(self, cell):
+        path_to_solution = self.specs['path_to_solution']
+        cache_files = [os.path.join(path_to_solution, self.test_class.SCHEMA_FILE)]
+        cache_files.extend(os.path.join(path_to_solution, self.test_class.DATASET_DIR, data_file)
+                           for data_file in cell.data_files if data_file != MarkusTestSpecs.MATRIX_NODATA_KEY)
+        if cell.test_extra.get('order_by') is not None:
+            test_name, test_ext = os.path.splitext(cell.test_file)
+            cache_files.append('{}_order{}'.format(test_name, test_ext))
+        return cache_files
+
+    def get_oracle_tables(self, cell):
+        """
+        Gets the oracle results that a cell compares against.
+        :param cell: A MarkusTestCell.
+        :return: A list of (table name, order by) tuples.
+        """
+        if cell.data_files[0] == MarkusTestSpecs.MATRIX_NODATA_KEY:
+            return []
+        return [(os.path.splitext(cell.test_file)[0], cell.test_extra.get('order_by'))]
+
+    def build_oracle_cache(self, oracle_user):
+        """
+        Fetches the oracle results of all cells and writes them to the oracle cache file, so that tests don't need to
+        query the oracle database.
+        :param oracle_user: The owner of the oracle database.
+        """
+        import psycopg2
+
+        results = {}
+        fingerprints = {}
+        connection = psycopg2.connect(database=self.oracle_database, user=oracle_user, host='localhost')
+        try:
+            cursor = connection.cursor()
+            for cell in self.specs.plan:
+                data_name = MarkusTestSpecs.DATA_FILES_SEPARATOR.join([os.path.splitext(data_file)[0]
+                                                                       for data_file in cell.data_files])
+                for table_name, order_by in self.get_oracle_tables(cell):
+                    key = (data_name, table_name, order_by)
+                    if key in results:
+                        continue
+                    query, query_vars = self.test_class.select_query(schema_name=data_name, table_name=table_name,
+                                                                     order_by=order_by)
+                    cursor.execute(query, query_vars)
+                    results[key] = (cursor.description, cursor.fetchall())
+                    if (data_name, table_name) not in fingerprints:
+                        query, query_vars = self.test_class.fingerprint_query(schema_name=data_name,
+                                                                              table_names=[table_name])
+                        # (the settings of the query must not apply to the next oracle results)
+                        cursor.execute('SAVEPOINT {}'.format(self.test_class.FETCH_SAVEPOINT))
+                        cursor.execute(query, query_vars)
+                        fingerprints[(data_name, table_name)] = list(cursor.fetchone()[1:])
+                        cursor.execute('ROLLBACK TO SAVEPOINT {0}; RELEASE SAVEPOINT {0}'.format(
+                            self.test_class.FETCH_SAVEPOINT))
+            connection.rollback()
+        finally:
+            connection.close()
+        MarkusSQLOracleCache.write(self.oracle_cache.path, results, fingerprints)
+
+    @staticmethod
+    def get_copy_order(cursor, schema_name):
+        """
+        Gets the tables of a schema, sorted so that tables referenced by foreign keys come before the tables referencing
+        them.
+        :return: The list of table names, or None if foreign keys reference each other in a cycle.
+        """
+        cursor.execute('''
+            SELECT c.relname, array_remove(array_agg(DISTINCT r.relname), NULL)
+            FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN pg_constraint con ON con.conrelid = c.oid AND con.contype = 'f' AND con.confrelid <> c.oid
+            LEFT JOIN pg_class r ON r.oid = con.confrelid AND r.relnamespace = n.oid
+            WHERE n.nspname = %(schema)s AND c.relkind = 'r'
+            GROUP BY c.relname''', {'schema': schema_name})
+        references = {table_name: set(referenced) for table_name, referenced in cursor.fetchall()}
+        order = []
+        while references:
+            ready = sorted(table_name for table_name, referenced in references.items() if not referenced)
+            if not ready:
+                return None
+            order.extend(ready)
+            for table_name in ready:
+                del references[table_name]
+            for referenced in references.values():
+                referenced.difference_update(ready)
+        return order
+
+    def export_dataset_copy(self, cursor, schema, data_file, copy_dir):
+        """
+        Loads a dataset into a temporary schema, then exports each of its tables as a COPY payload, in an order that
+        satisfies the foreign keys. The caller must roll the transaction back.
+        :return: The manifest of the payloads, or None if the dataset can't be loaded with COPY alone (it changes more
+                 than the rows of the tables, their foreign keys have cycles, or the schema inserts rows or has triggers
+                 or rules, which would run again when the schema is loaded before the payloads).
+        """
+        import psycopg2
+
+        schema_name = 'markus_dataset_copy'
+        cursor.execute('CREATE SCHEMA {0}; SET LOCAL search_path TO {0}'.format(schema_name))
+        cursor.execute(schema)
+        tables = self.get_copy_order(cursor, schema_name)
+        if tables is None:
+            return None
+        cursor.execute(self.test_class.COPY_SCHEMA_CHECK_QUERY, {'schema': schema_name})
+        if cursor.fetchone()[0] > 0:
+            return None
+        for table_name in tables:
+            cursor.execute('SELECT 1 FROM {}.{} LIMIT 1'.format(schema_name,
+                                                                psycopg2.extensions.quote_ident(table_name, cursor)))
+            if cursor.fetchone() is not None:
+                return None
+        cursor.execute(self.test_class.COPY_CHECK_QUERY)
+        catalog = cursor.fetchone()
+        with open(os.path.join(self.specs['path_to_solution'], self.test_class.DATASET_DIR, data_file)) as data_open:
+            cursor.execute(data_open.read())
+        cursor.execute(self.test_class.COPY_CHECK_QUERY)
+        if cursor.fetchone() != catalog:
+            return None
+        for i, table_name in enumerate(tables):
+            with open(os.path.join(copy_dir, '{}.copy'.format(i)), 'wb') as copy_open:
+                cursor.copy_expert('COPY {}.{} TO STDOUT'.format(
+                    schema_name, psycopg2.extensions.quote_ident(table_name, cursor)), copy_open)
+        cursor.execute('''
+            SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %(schema)s AND c.relkind = 'S'
+            ORDER BY c.relname''', {'schema': schema_name})
+        sequences = {}
+        for sequence_name, in cursor.fetchall():
+            cursor.execute('SELECT last_value, is_called FROM {}.{}'.format(
+                schema_name, psycopg2.extensions.quote_ident(sequence_name, cursor)))
+            sequences[sequence_name] = list(cursor.fetchone())
+        return {'version': self.test_class.COPY_VERSION,
+                'sources': self.test_class.get_dataset_sources(self.specs['path_to_solution'], data_file),
+                'tables': tables, 'sequences': sequences}
+
+    def build_dataset_copies(self, oracle_user):
+        """
+        Converts the datasets of all cells to COPY payloads, which tests load much faster than the dataset sql files.
+        Datasets that can't be converted keep being loaded from their sql files.
+        :param oracle_user: The owner of the oracle database, where the datasets are loaded temporarily.
+        """
+        import psycopg2
+
+        path_to_solution = self.specs['path_to_solution']
+        with open(os.path.join(path_to_solution, self.test_class.SCHEMA_FILE)) as schema_open:
+            schema = schema_open.read()
+        data_files = sorted({data_file for cell in self.specs.plan for data_file in cell.data_files
+                             if data_file != MarkusTestSpecs.MATRIX_NODATA_KEY})
+        connection = psycopg2.connect(database=self.oracle_database, user=oracle_user, host='localhost')
+        try:
+            cursor = connection.cursor()
+            for data_file in data_files:
+                copy_dir = os.path.join(path_to_solution, self.test_class.COPY_DIR, data_file)
+                manifest_file = os.path.join(copy_dir, self.test_class.COPY_MANIFEST)
+                os.makedirs(copy_dir, exist_ok=True)
+                if os.path.exists(manifest_file):
+                    os.remove(manifest_file)
+                try:
+                    manifest = self.export_dataset_copy(cursor, schema, data_file, copy_dir)
+                finally:
+                    connection.rollback()
+                if manifest is None:
+                    print('Dataset {} can\'t be converted to COPY, it stays loaded from sql'.format(data_file))
+                    continue
+                with open(manifest_file, 'w') as manifest_open:
+                    json.dump(manifest, manifest_open)
+        finally:
+            connection.close()
+
+    def init_oracle_db(self):
+        import psycopg2
 
-    def init_db(self):
         self.oracle_connection = psycopg2.connect(database=self.oracle_database, user=self.user_name,
                                                   password=self.user_password, host='localhost')
         self.oracle_cursor = self.oracle_connection.cursor()
+
+    def set_database(self, database, lease):
+        self.database_lease = lease
+        self.test_database = database['database']
+        self.user_name = database['user']
+        self.user_password = database['password']
+
+    def init_db(self):
+        if self.test_connection is not None and not self.test_connection.closed:  # reused across a batch
+            return
+        import psycopg2
+
+        if self.database_lease is None:  # else leased by the run for this worker
+            self.set_database(*self.database_pool.lease())
+        self.schema_templates = {}
+        self.loaded_dataset = None
+        if len(self.oracle_cache) == 0:  # else connected on the first cache miss
+            self.init_oracle_db()
         self.test_connection = psycopg2.connect(database=self.test_database, user=self.user_name,
                                                 password=self.user_password, host='localhost')
         self.test_cursor = self.test_connection.cursor()
@@ -255,12 +1109,66 @@ class MarkusSQLTester(MarkusTester):
             self.oracle_cursor.close()
         if self.oracle_connection:
             self.oracle_connection.close()
+        self.oracle_connection = None
+        self.oracle_cursor = None
+        self.test_connection = None
+        self.test_cursor = None
+        if self.database_lease is not None:
+            self.database_pool.release(self.database_lease)
+            self.database_lease = None
+
+    def close(self):
+        self.close_db()
+
+    def run_test(self, cell, feedback_open):
+        self.init_db()  # connected on the first test run by this process, cached results don't need it
+        return super().run_test(cell, feedback_open)
+
+    def init_worker(self):
+        self.set_database(*self.worker_databases.get())
+
+    def run_parallel(self, cells, feedback_open, writer, workers):
+        # forked workers can't share the connections: a test database is leased for each worker before forking, so that
+        # a worker never waits for a database held by a sibling (which would only release it at the end of the run)
+        self.close_db()
+        databases = [self.database_pool.lease()]
+        databases.extend(self.database_pool.lease_free(min(workers, len(cells)) - 1))
+        if len(databases) == 1:  # no other database is free
+            self.set_database(*databases[0])
+            self.run_serial(cells, feedback_open, writer)
+            return
+        import multiprocessing
+
+        self.worker_databases = multiprocessing.get_context('fork').SimpleQueue()
+        for database in databases:
+            self.worker_databases.put(database)
+        try:
+            super().run_parallel(cells, feedback_open, writer, len(databases))
+        finally:
+            self.worker_databases = None
+            for _, lease in databases:
+                self.database_pool.release(lease)
 
     def run(self):
         try:
-            self.init_db()
+            self.schema_templates = {}  # rebuilt in each run, previous submissions may have altered them
+            self.loaded_dataset = None
             super().run()
         except Exception as e:
-            print(MarkusTester.error_all(message=str(e)))
+            self.write_error_all(message=str(e))
         finally:
-            self.close_db()
+            if self.loaded_dataset is not None and self.test_connection is not None:
+                self.test_connection.rollback()
+                self.loaded_dataset = None
+            if not self.in_batch:
+                self.close_db()
+
+
+if __name__ == '__main__':
+    # builds the oracle cache and the dataset copies when initializing the specs
+    if len(sys.argv) != 3:
+        print('Usage: {} specs_file oracle_user'.format(sys.argv[0]))
+        sys.exit(1)
+    tester = MarkusSQLTester(MarkusTestSpecs(sys.argv[1]))
+    tester.build_oracle_cache(sys.argv[2])
+    tester.build_dataset_copies(sys.argv[2])
@@ -0,0 +1,101 @@
+import os
+import subprocess
+import sys
+import types
+import unittest
+from unittest import mock
+
+TESTERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in ['', 'sql/server', 'jdbc/server']:
+    sys.path.insert(0, os.path.join(TESTERS_DIR, path))
+
+from markus_jdbc_tester import MarkusJDBCTest  # noqa: E402
+from markus_sql_tester import MarkusSQLColumn  # noqa: E402
+from markus_tester import MarkusTest  # noqa: E402
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakeOracleCache:
+    """
+    An oracle cache holding the results of every oracle table, like after the specs are initialized.
+    """
+
+    def get(self, key):
+        return ['id'], [(1,)]
+
+    def get_fingerprint(self, key):
+        return None
+
+
+class TestCachedOracleErrors(unittest.TestCase):
+    """
+    With the oracle cache, the tests have no oracle connection: the errors must still be reported as test results.
+    """
+
+    def create_test(self, points):
+        tester = types.SimpleNamespace(oracle_database='oracle', test_database='test', user_name='user',
+                                       user_password='password', oracle_connection=None, oracle_cursor=None,
+                                       test_connection=FakeConnection(), test_cursor=None, java_classpath='.',
+                                       java_server=None, oracle_cache=FakeOracleCache(),
+                                       specs={'path_to_solution': '.', 'schema_name': 'ate'})
+        return MarkusJDBCTest(tester, 'Test.insert', ['data.sql'], points, {}, None)
+
+    def test_java_error(self):
+        test = self.create_test(points=1)
+        java_error = subprocess.CalledProcessError(1, ['java'], output='', stderr='boom')
+        with mock.patch.object(test, 'set_test_schema'), mock.patch.object(test, 'check_java', side_effect=java_error):
+            result = test.run()
+        self.assertIs(result.status, MarkusTest.Status.ERROR)
+        self.assertIn('boom', result.output)
+        self.assertEqual(test.test_connection.commits, 1)
+
+    def test_table_error(self):
+        test = self.create_test(points={MarkusJDBCTest.JAVA_POINTS_KEY: 1, 'table1': 1})
+        java = subprocess.CompletedProcess(['java'], 0, stdout=MarkusTest.Status.PASS.value, stderr='')
+        with mock.patch.object(test, 'set_test_schema'), mock.patch.object(test, 'check_java', return_value=java), \
+                mock.patch.object(test, 'get_test_results', side_effect=Exception('no table1')):
+            result = test.run()
+        self.assertIs(result.status, MarkusTest.Status.PARTIAL)
+        self.assertEqual(result.points_earned, 1)
+        self.assertIn('(Table table1) no table1', result.output)
+
+
+class TestBatchedTables(unittest.TestCase):
+    """
+    The tables that don't match their fingerprints are fetched with a single query per connection.
+    """
+
+    def test_tables(self):
+        columns = [MarkusSQLColumn('id', 23)]
+        oracle_cache = types.SimpleNamespace(get=lambda key: (columns, [(1,), (2,)]), get_fingerprint=lambda key: None)
+        tester = types.SimpleNamespace(oracle_database='oracle', test_database='test', user_name='user',
+                                       user_password='password', oracle_connection=None, oracle_cursor=None,
+                                       test_connection=FakeConnection(), test_cursor=None, java_classpath='.',
+                                       java_server=None, oracle_cache=oracle_cache,
+                                       specs={'path_to_solution': '.', 'schema_name': 'ate'})
+        points = {MarkusJDBCTest.JAVA_POINTS_KEY: 1, 'table1': 2, 'table2': 4}
+        test = MarkusJDBCTest(tester, 'Test.insert', ['data.sql'], points, {}, None)
+        test_tables = {'table1': ([(2,), (1,)], 2, columns), 'table2': ([(1,)], 1, columns)}
+        java = subprocess.CompletedProcess(['java'], 0, stdout=MarkusTest.Status.PASS.value, stderr='')
+        with mock.patch.object(test, 'set_test_schema'), mock.patch.object(test, 'check_java', return_value=java), \
+                mock.patch.object(test, 'fetch_tables', return_value=test_tables) as fetch_tables, \
+                mock.patch.object(test, 'get_test_results', side_effect=AssertionError('fetched on its own')):
+            result = test.run()
+        fetch_tables.assert_called_once_with(test.test_connection, 'ate', ['table1', 'table2'],
+                                             {'table1': 3, 'table2': 3})
+        self.assertIs(result.status, MarkusTest.Status.PARTIAL)
+        self.assertEqual(result.points_earned, 3)
+        message = MarkusJDBCTest.ERROR_MSGS['bad_row_count'].format(2, 1)
+        self.assertEqual(result.output, '(Table table2) {}'.format(message))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from markus_tester import MarkusTestPlan, MarkusTestSpecs  # noqa: E402
+
+
+class TestSpecsPlanCache(unittest.TestCase):
+    """
+    The client scripts assign points before every run: the compiled plan must survive it.
+    """
+
+    def setUp(self):
+        self.specs_dir = tempfile.TemporaryDirectory()
+        self.specs_file = os.path.join(self.specs_dir.name, 'specs.json')
+        matrix = {'q1.sql': {'data1.sql': 1, 'data2.sql': 1},
+                  'q2.sql': {'data1.sql': 1, 'extra': {'order_by': 'a'}},
+                  'q3.sql': {'data2.sql': 1}}
+        with open(self.specs_file, 'w') as specs_open:
+            json.dump({'matrix': matrix}, specs_open)
+        MarkusTestSpecs(self.specs_file)  # writes the cache
+
+    def tearDown(self):
+        self.specs_dir.cleanup()
+
+    def assert_plan(self, specs, dump):
+        with mock.patch.object(MarkusTestPlan, 'compile', side_effect=AssertionError('the plan was compiled again')):
+            plan = specs.plan.dump()
+        self.assertEqual(plan, dump)
+        self.assertEqual(plan, MarkusTestPlan.compile(specs.matrix).dump())
+
+    def test_data_points(self):
+        # like the sql client script
+        specs = MarkusTestSpecs(self.specs_file)
+        specs['data_points'] = {'data1.sql': 2, 'data2.sql': 3}
+        self.assert_plan(specs, [('q1.sql', ['data1.sql'], 2, {}),
+                                 ('q1.sql', ['data2.sql'], 3, {}),
+                                 ('q2.sql', ['data1.sql'], 2, {'order_by': 'a'}),
+                                 ('q3.sql', ['data2.sql'], 3, {})])
+
+    def test_new_cells(self):
+        specs = MarkusTestSpecs(self.specs_file)
+        specs['points'] = {'q1.sql': {'data0.sql': 4}, 'q2.sql': {'data2.sql': 5}}
+        specs['test_points'] = {'q0.sql': 6}
+        self.assert_plan(specs, [('q0.sql', ['nodata'], 6, {}),
+                                 ('q1.sql', ['data0.sql'], 4, {}),
+                                 ('q1.sql', ['data1.sql'], 1, {}),
+                                 ('q1.sql', ['data2.sql'], 1, {}),
+                                 ('q2.sql', ['data1.sql'], 1, {'order_by': 'a'}),
+                                 ('q2.sql', ['data2.sql'], 5, {'order_by': 'a'}),
+                                 ('q3.sql', ['data2.sql'], 1, {})])
+
+    def test_all_points(self):
+        specs = MarkusTestSpecs(self.specs_file)
+        specs['all_points'] = 7
+        specs['test_points'] = {'q3.sql': 8}
+        self.assert_plan(specs, [('q1.sql', ['data1.sql'], 7, {}),
+                                 ('q1.sql', ['data2.sql'], 7, {}),
+                                 ('q2.sql', ['data1.sql'], 7, {'order_by': 'a'}),
+                                 ('q3.sql', ['data2.sql'], 8, {})])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import collections
+import importlib.util
+import os
+import sys
+import types
+import unittest
+
+TESTERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in ['', 'sql/server']:
+    sys.path.insert(0, os.path.join(TESTERS_DIR, path))
+
+from markus_sql_tester import MarkusSQLRows, MarkusSQLTest  # noqa: E402
+from markus_tester import MarkusTest  # noqa: E402
+
+Column = collections.namedtuple('Column', ['name', 'type_code'])
+
+
+class TestMarkusSQLRows(unittest.TestCase):
+
+    def test_pop_order(self):
+        first, second = (1, 'a'), (1, 'a')
+        rows = MarkusSQLRows([first, (2, 'b'), second])
+        self.assertIs(rows.pop((1, 'a')), first)
+        self.assertIs(rows.pop((1, 'a')), second)
+        self.assertIsNone(rows.pop((1, 'a')))
+
+    def test_pop_unhashable_row(self):
+        rows = MarkusSQLRows([(1, frozenset([2])), (3, 'c')])
+        self.assertIsNone(rows.pop((3, ['c'])))
+        self.assertEqual(rows.pop((1, {2})), (1, frozenset([2])))
+        self.assertIsNone(rows.pop((1, {2})))
+
+
+class TestCheckResults(unittest.TestCase):
+
+    def create_test(self):
+        test = MarkusSQLTest.__new__(MarkusSQLTest)
+        test.tester = types.SimpleNamespace()
+        test.oracle_columns = [Column('id', 23), Column('tags', 1009)]
+        test.test_columns = [Column('id', 23), Column('tags', 1009)]
+        return test
+
+    def test_unhashable_oracle_rows(self):
+        # the test rows can be hashed, but the oracle rows can't (e.g. an array column returns lists)
+        test = self.create_test()
+        status, message = test.check_results([(1, ['a'])], [(1, 'a')], order_on=False)
+        self.assertIs(status, MarkusTest.Status.FAIL)
+        self.assertEqual(message, MarkusSQLTest.ERROR_MSGS['bad_row_content_no_order'].format((1, ['a'])))
+
+    def test_unhashable_rows(self):
+        test = self.create_test()
+        status, _ = test.check_results([(1, ['a']), (2, ['b'])], [(2, ['b']), (1, ['a'])], order_on=False)
+        self.assertIs(status, MarkusTest.Status.PASS)
+
+
+class FakeCursor:
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def execute(self, query, query_vars=None):
+        self.statements.append(query)
+
+    def fetchall(self):
+        return self.rows
+
+
+@unittest.skipUnless(importlib.util.find_spec('psycopg2'), 'psycopg2 is not installed')
+class TestCheckFingerprints(unittest.TestCase):
+
+    def test_settings_rolled_back(self):
+        # the fingerprint query settings must not apply to the full comparison of the tables that don't match
+        fingerprint = [2, 'hash', ['id'], [23]]
+        test = MarkusSQLTest.__new__(MarkusSQLTest)
+        test.tester = types.SimpleNamespace(oracle_cache=types.SimpleNamespace(get_fingerprint=lambda key: fingerprint))
+        test.data_files = ['data.sql']
+        test.schema_name = 'ate'
+        test.test_cursor = FakeCursor([('table1', *fingerprint), ('table2', 1, 'other', ['id'], [23])])
+        self.assertEqual(test.check_fingerprints(['table1', 'table2']), {'table1'})
+        self.assertEqual(test.test_cursor.statements[-1], 'ROLLBACK TO SAVEPOINT {0}; RELEASE SAVEPOINT {0}'.format(
+            MarkusSQLTest.FETCH_SAVEPOINT))
+
+
+if __name__ == '__main__':
+    unittest.main()
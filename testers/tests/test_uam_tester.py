@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import unittest
+
+TESTERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TESTERS_DIR)
+
+from uam_tester import UAMResult, UAMTester  # noqa: E402
+
+
+class FileUAMTester(UAMTester):
+
+    def generate_results(self):
+        pass
+
+
+class TestCollectResults(unittest.TestCase):
+
+    def run_tester(self, content):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        result_filename = os.path.join(tmp_dir.name, 'result.json')
+        with open(result_filename, 'wb') as result_open:
+            result_open.write(content)
+        tester = FileUAMTester('uam', tmp_dir.name, {'test.py': {}}, result_filename=result_filename)
+        return list(tester.run())
+
+    def test_results(self):
+        results = self.run_tester(b'{"results": {"test.Test": {"passes": {"test.Test.test_a": "a"}, "failures":'
+                                  b' {"test.Test.test_b": {"description": "", "message": "b", "details": ["t"]}}}}}')
+        self.assertEqual([(result.test_name, result.status) for result in results],
+                         [('test_a', UAMResult.Status.PASS), ('test_b', UAMResult.Status.FAIL)])
+        self.assertEqual(results[1].trace, ['t'])
+
+    def test_truncated_file(self):
+        with self.assertRaisesRegex(Exception, 'UAM framework error: malformed result file'):
+            self.run_tester(b'{"results": {"test.Test": {"passes": {"test.Test.test_a": ""}')
+
+    def test_missing_results(self):
+        with self.assertRaisesRegex(Exception, 'UAM framework error: malformed result file'):
+            self.run_tester(b'{"errors": {}}')
+
+    def test_empty_file(self):
+        with self.assertRaisesRegex(Exception, 'UAM framework error: malformed result file'):
+            self.run_tester(b'')
+
+    def test_parse_error_during_iteration(self):
+        results = self.run_tester(b'{"results": {"test.Test": {"passes": {"test.Test.test_a": ""},'
+                                  b' "failures": {"test.Test.test_b": {"details": []}}}}}')
+        self.assertEqual(results[0].status, UAMResult.Status.PASS)
+        error = results[-1]
+        self.assertEqual(error.status, UAMResult.Status.ERROR)
+        self.assertIsNone(error.file_name)
+        self.assertTrue(error.message.startswith('UAM framework error: malformed result file'))
+
+
+if __name__ == '__main__':
+    unittest.main()
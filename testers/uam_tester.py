@@ -1,26 +1,56 @@
 import enum
 import json
+import mmap
+import os
+import re
 import subprocess
 
+_JSON_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_JSON_NESTED = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]]', re.DOTALL)
+_JSON_SCALAR = re.compile(rb'[^ \t\n\r,:{}\[\]"]+')
+_JSON_OBJECT_START = re.compile(rb'[ \t\n\r]*\{[ \t\n\r]*(\})?')
+_JSON_MEMBER = re.compile(rb'"([^"\\]*(?:\\.[^"\\]*)*)"[ \t\n\r]*:[ \t\n\r]*', re.DOTALL)
+_JSON_SEPARATOR = re.compile(rb'[ \t\n\r]*([,}])[ \t\n\r]*')
+_JSON_WHITESPACE = re.compile(rb'[ \t\n\r]*')
+
 
 class UAMResult:
     """
-    A test result from uam.
+    A test result from uam. The trace of a failure is only read from the result file when needed.
     """
 
+    __slots__ = ('file_name', 'class_name', 'test_name', 'status', 'description', 'message', '_trace',
+                 '_trace_source')
+
     class Status(enum.Enum):
         PASS = 1
         FAIL = 2
         ERROR = 3
 
-    def __init__(self, file_name, class_name, test_name, status, description=None, message=None, trace=None):
+    def __init__(self, file_name, class_name, test_name, status, description=None, message=None, trace=None,
+                 trace_source=None):
+        """
+        :param trace_source: The (file name, start offset, end offset) of the json trace in a result file, read when
+                             the trace is None.
+        """
         self.file_name = file_name
         self.class_name = class_name
         self.test_name = test_name
         self.status = status
         self.description = description
         self.message = message
-        self.trace = trace
+        self._trace = trace
+        self._trace_source = trace_source
+
+    @property
+    def trace(self):
+        if self._trace is None and self._trace_source is not None:
+            file_name, start, end = self._trace_source
+            with open(file_name, 'rb') as file_open:
+                file_open.seek(start)
+                self._trace = json.loads(file_open.read(end - start).decode())
+            self._trace_source = None
+        return self._trace
 
     @property
     def test_title(self):
@@ -30,6 +60,83 @@ class UAMResult:
         return title
 
 
+class UAMResultReader:
+    """
+    A pull parser over the json bytes of a uam result file, which only decodes the values that are read.
+    """
+
+    def __init__(self, buffer):
+        """
+        :param buffer: The json bytes (e.g. a mmap of the result file).
+        """
+        self.buffer = buffer
+        self.pos = 0
+
+    def error(self, expected):
+        return ValueError('Expected {} at byte {} of the result file'.format(expected, self.pos))
+
+    def skip_value(self):
+        """
+        Moves past the next value, without decoding it.
+        :return: The (start, end) positions of the value.
+        """
+        start = self.pos
+        first = self.buffer[start:start + 1]
+        if first == b'{' or first == b'[':
+            depth = 0
+            for match in _JSON_NESTED.finditer(self.buffer, start):
+                token = match.group()
+                if token == b'{' or token == b'[':
+                    depth += 1
+                elif token == b'}' or token == b']':
+                    depth -= 1
+                    if depth == 0:
+                        self.pos = match.end()
+                        return start, self.pos
+            raise self.error('the end of a json value')
+        match = (_JSON_STRING if first == b'"' else _JSON_SCALAR).match(self.buffer, start)
+        if match is None:
+            raise self.error('a json value')
+        self.pos = match.end()
+        return start, self.pos
+
+    def read_value(self):
+        """
+        Moves past the next value, and decodes it.
+        """
+        start, end = self.skip_value()
+        value = self.buffer[start:end]
+        if value[:1] == b'"' and b'\\' not in value:
+            return value[1:-1].decode()
+        return json.loads(value.decode())
+
+    def iter_object(self):
+        """
+        Moves into the next object, and iterates over its keys: after each key, the value must be read or skipped
+        before moving to the next one.
+        :return: A generator of keys.
+        """
+        match = _JSON_OBJECT_START.match(self.buffer, self.pos)
+        if match is None:
+            raise self.error("'{'")
+        self.pos = match.end()
+        if match.group(1):  # empty object
+            return
+        while True:
+            match = _JSON_MEMBER.match(self.buffer, self.pos)
+            if match is None:
+                raise self.error('a json object member')
+            key = match.group(1)
+            self.pos = match.end()
+            yield key.decode() if b'\\' not in key else json.loads(b'"' + key + b'"')
+            match = _JSON_SEPARATOR.match(self.buffer, self.pos)
+            if match is None:
+                raise self.error("',' or '}'")
+            self.pos = match.end()
+            if match.group(1) == b'}':
+                return
+
+
 class UAMTester:
     """
     A base wrapper class to run a uam tester (https://github.com/ProjectAT/uam).
@@ -40,6 +147,9 @@ class UAMTester:
         'no_result': 'UAM framework error: no result file generated',
         'timeout': 'Tests timed out'
     }
+    RESULT_SECTIONS = ('passes', 'failures', 'errors')
+    RESULT_SECTIONS_STATUS = {'passes': UAMResult.Status.PASS, 'failures': UAMResult.Status.FAIL,
+                              'errors': UAMResult.Status.ERROR}
     GLOBAL_TIMEOUT_DEFAULT = 30
     TEST_TIMEOUT_DEFAULT = 10
 
@@ -71,40 +181,105 @@ class UAMTester:
 
     def collect_results(self):
         """
-        Collects results from a tester result file.
-        :return: A list of results.
-        """
-        results = []
-        with open(self.result_filename) as result_file:
-            result = json.load(result_file)
-            for file_class, test_result in result['results'].items():
-                file_class_names = file_class.split('.')
-                if len(file_class_names) == 1:  # Class (java) or file (python)
-                    file_name = file_class_names[0]
-                    class_name = file_class_names[0] if file_name.istitle() else None
-                else:  # file.Class (python)
-                    file_name = file_class_names[0]
-                    class_name = file_class_names[1]
-                if 'passes' in test_result:
-                    for test_id, test_desc in test_result['passes'].items():
-                        test_name = test_id.rpartition(':')[2] if ':' in test_id else test_id.rpartition('.')[2]
-                        results.append(
-                            UAMResult(file_name, class_name, test_name, status=UAMResult.Status.PASS,
-                                      description=test_desc))
-                if 'failures' in test_result:
-                    for test_id, test_stack in test_result['failures'].items():
-                        test_name = test_id.rpartition(':')[2] if ':' in test_id else test_id.rpartition('.')[2]
-                        results.append(
-                            UAMResult(file_name, class_name, test_name, status=UAMResult.Status.FAIL,
-                                      description=test_stack['description'], message=test_stack['message'],
-                                      trace=test_stack['details']))
-                if 'errors' in test_result:
-                    for test_id, test_stack in test_result['errors'].items():
-                        test_name = test_id.rpartition(':')[2] if ':' in test_id else test_id.rpartition('.')[2]
-                        results.append(
-                            UAMResult(file_name, class_name, test_name, status=UAMResult.Status.ERROR,
-                                      description=test_stack['description'], message=test_stack['message']))
-        return results
+        Collects results from a tester result file. The file is parsed while the results are iterated, so that only
+        one result at a time is kept in memory: its top-level structure is checked first, so that a truncated file
+        fails before any result is reported, and a later parse error ends the results with an error result.
+        :return: A generator of results.
+        :raise OSError: If the result file can't be read.
+        :raise ValueError: If the result file is not a complete json object with a results object.
+        """
+        result_open = open(self.result_filename, 'rb')
+        try:
+            if os.fstat(result_open.fileno()).st_size == 0:
+                raise ValueError('The result file is empty')
+            buffer = mmap.mmap(result_open.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                reader = UAMResultReader(buffer)
+                self._find_results(reader)
+            except BaseException:
+                buffer.close()
+                raise
+        except BaseException:
+            result_open.close()
+            raise
+        return self._collect_results(result_open, buffer, reader, os.path.abspath(self.result_filename))
+
+    @staticmethod
+    def _find_results(reader):
+        """
+        Checks that the result file is a single complete json object, without decoding it, then moves the reader to
+        the start of its results object.
+        """
+        reader.pos = _JSON_WHITESPACE.match(reader.buffer).end()
+        if reader.buffer[reader.pos:reader.pos + 1] != b'{':
+            raise reader.error("'{'")
+        reader.skip_value()
+        reader.pos = _JSON_WHITESPACE.match(reader.buffer, reader.pos).end()
+        if reader.pos != len(reader.buffer):
+            raise reader.error('the end of the result file')
+        reader.pos = 0
+        for key in reader.iter_object():
+            if key == 'results':
+                break
+            reader.skip_value()
+        else:
+            raise ValueError("Missing 'results' in the result file")
+        if reader.buffer[reader.pos:reader.pos + 1] != b'{':
+            raise reader.error('the results object')
+
+    def _collect_results(self, result_open, buffer, reader, result_path):
+        try:
+            yield from self._collect_file_classes(reader, result_path)
+        except (ValueError, KeyError) as e:  # the results read so far are already reported
+            message = self.ERROR_MGSG['uam_error'].format('malformed result file ({})'.format(e))
+            yield UAMResult(None, None, 'All tests', status=UAMResult.Status.ERROR, message=message)
+        finally:
+            buffer.close()
+            result_open.close()
+
+    def _collect_file_classes(self, reader, result_path):
+        for file_class in reader.iter_object():
+            file_class_names = file_class.split('.')
+            if len(file_class_names) == 1:  # Class (java) or file (python)
+                file_name = file_class_names[0]
+                class_name = file_class_names[0] if file_name.istitle() else None
+            else:  # file.Class (python)
+                file_name = file_class_names[0]
+                class_name = file_class_names[1]
+            # yield the sections in order, reading those found out of order once the others are done
+            next_section = 0
+            deferred = {}
+            for section in reader.iter_object():
+                if section not in self.RESULT_SECTIONS:
+                    reader.skip_value()
+                elif self.RESULT_SECTIONS.index(section) == next_section:
+                    yield from self._collect_section(reader, result_path, file_name, class_name, section)
+                    next_section += 1
+                else:
+                    deferred[section] = reader.skip_value()[0]
+            file_class_end = reader.pos
+            for section in self.RESULT_SECTIONS[next_section:]:
+                if section in deferred:
+                    reader.pos = deferred[section]
+                    yield from self._collect_section(reader, result_path, file_name, class_name, section)
+            reader.pos = file_class_end
+
+    def _collect_section(self, reader, result_path, file_name, class_name, section):
+        status = self.RESULT_SECTIONS_STATUS[section]
+        for test_id in reader.iter_object():
+            test_name = test_id.rpartition(':')[2] if ':' in test_id else test_id.rpartition('.')[2]
+            if status is UAMResult.Status.PASS:
+                yield UAMResult(file_name, class_name, test_name, status=status, description=reader.read_value())
+                continue
+            test_stack = {}
+            for stack_key in reader.iter_object():
+                if stack_key == 'details':  # read when needed
+                    test_stack[stack_key] = (result_path,) + reader.skip_value()
+                else:
+                    test_stack[stack_key] = reader.read_value()
+            trace_source = test_stack['details'] if status is UAMResult.Status.FAIL else None
+            yield UAMResult(file_name, class_name, test_name, status=status, description=test_stack['description'],
+                            message=test_stack['message'], trace_source=trace_source)
 
     def get_test_points(self, result, file_ext):
         """
@@ -113,14 +288,22 @@ class UAMTester:
         :param file_ext: The test file extension.
         :return: The total available points
         """
+        if result.file_name is None:  # an error reading the result file, not a test
+            return 0
         test_file = '{}.{}'.format(result.file_name, file_ext)
         test_points = self.test_points[test_file]
         return test_points.get(result.test_name, test_points.get(result.class_name, 1))
 
+    def close(self):
+        """
+        Releases the resources kept open across runs.
+        """
+        pass
+
     def run(self):
         """
         Runs the tester.
-        :return A list of test results.
+        :return A generator of test results.
         """
         try:
             self.generate_results()
@@ -131,3 +314,5 @@ class UAMTester:
             raise Exception(self.ERROR_MGSG['uam_error'].format(e.stdout))
         except OSError:
             raise Exception(self.ERROR_MGSG['no_result'])
+        except ValueError as e:
+            raise Exception(self.ERROR_MGSG['uam_error'].format('malformed result file ({})'.format(e)))
@@ -6,7 +6,6 @@ from os.path import isfile
 
 from markus_tester import MarkusTestSpecs
 from markus_xquery_tester import MarkusXQueryTester
-from markusapi import Markus
 
 
 if __name__ == '__main__':
@@ -35,6 +34,7 @@ if __name__ == '__main__':
     tester.run()
     # use markus apis if needed
     # if isfile(FEEDBACK_FILE):
+    #     from markusapi import Markus  # imported only when needed, to keep the startup fast
     #     api = Markus(api_key, root_url)
     #     with open(FEEDBACK_FILE) as feedback_open:
     #         api.upload_feedback_file(assignment_id, group_id, FEEDBACK_FILE, feedback_open.read())
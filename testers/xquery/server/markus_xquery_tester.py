@@ -2,8 +2,6 @@ import subprocess
 
 from os.path import isfile, join
 
-from xmltodict import parse
-
 from markus_tester import MarkusTester, MarkusTest
 
 
@@ -16,6 +14,13 @@ class MarkusXQueryTester(MarkusTester):
         super().__init__(specs=specs, feedback_file=feedback_file)
         self.path_to_solution = specs['path_to_solution']
 
+    def get_cache_files(self, cell):
+        cache_files = [join(self.path_to_solution, self.DATASET_DIR, data_file) for data_file in cell.data_files]
+        cache_files.append(join(self.path_to_solution, self.SCHEMA_DIR, cell.test_extra['out_schema']))
+        test = self.create_test(cell.test_file, cell.data_files, cell.points, cell.test_extra, None)
+        cache_files.append(test.oracle_file)
+        return cache_files
+
     def create_test(self, test_file, data_files, test_data_config, test_extra, feedback_open):
         return MarkusXQueryTest(test_file, data_files, test_data_config, test_extra, feedback_open,
                                 self.path_to_solution)
@@ -67,9 +72,12 @@ class MarkusXQueryTest(MarkusTest):
 
         return test_xml
 
+    @property
+    def oracle_file(self):
+        return join(self.path_to_solution, '{}.xml'.format(self.test_data_name.replace(' ', '')))
+
     def get_oracle_solution(self):
-        oracle_file = join(self.path_to_solution, '{}.xml'.format(self.test_data_name.replace(' ', '')))
-        with open(oracle_file, 'r') as oracle_open:
+        with open(self.oracle_file, 'r') as oracle_open:
             oracle_xml = oracle_open.read()
             return oracle_xml
 
@@ -84,6 +92,8 @@ class MarkusXQueryTest(MarkusTest):
             return obj
 
     def check_content(self, oracle_xml, test_xml):
+        from xmltodict import parse  # imported on first use, to keep the startup of short test runs fast
+
         oracle_dict = parse(oracle_xml, dict_constructor=dict)
         oracle_dict = self.sort_dict(oracle_dict)
         test_dict = parse(test_xml, dict_constructor=dict)